@@ -1,170 +1,168 @@
 import math
+from array import array
 
 # Function provided in the paper to calcualte time-related scores for common network
 def calcTime(a, BaseL, DDL):
     return (a-BaseL)/(DDL-BaseL)
 
-# class for each author
-class Author(object):
-    
-    # author name
-    __name = ""  
-    
-    # indices of PRs related to the author
-    __PRList = []
-    
-    def __init__(self, nm):
-        self.__name = nm
-        self.__PRList = []
-        
-    def addPR(self, PRId):
-        self.__PRList.append(PRId)
-        return 0
-        
-    def __getPR(self):
-        return self.__PRList
-        
-    # called when merge 2 author objects when 2 objects have the same author name. Literally only one author exists in fact
-    def extendAuthor(self, otherAu):
-        if self.__name != otherAu.getName():
-            return 1
-        self.__PRList.extend(otherAu.__getPR())        
-        del(otherAu)
-        return 0
-        
-    def getName(self):
-        return self.__name
-    
-    # for test
-    def getPR(self):
-        return self.__PRList
-     
 # the author list of all authors in the training dataset
+# every author gets a dense integer id in order of first appearance
 class AuthorList:
     
-    # the list of all authors by ascending dictionary order of author names
-    __l = []    
-    
-    # relation scores for each pair of authors
-    __relations = []
-    
     def __init__(self):
-        self.__l = []
+        self.clear()
         
     def clear(self):
-        self.__l = []
+        # author name -> id
+        self.__ids = {}
+        # id -> author name
+        self.__names = []
+        # ids by ascending dictionary order of author names. Built when needed
+        self.__order = None
+        self.__rank = None
+        # relation scores for each pair of authors
+        self.__relations = []
         
     ##############################################################################
-    # find the author index in the list given the author name
-    # because the list has an order, the search uses divide & conquer to save time
+    # find the author id given the author name
     #
     # Input:
     #   name: the author name
     #
     # Output:
     #   [ans, existance]
-    #   ans: the index of author object in the author list. 
-    #        If no such author is found by given input name, it will return the author with highest dictionary order which is lower than the given input name
+    #   ans: the id of the author, or -1 if no such author is found by given input name
     #   existance: boolean value of whether the given name exists in the author list
     ##############################################################################
     def find(self, name):
-        head = 0
-        tail = self.length() - 1
-        while (head <= tail):
-            mid = (head + tail)//2
-            if self.__l[mid].getName() <= name:
-                head = mid+1
-            else:
-                tail = mid-1
-        ans = head - 1
-        
-        if (ans < 0):
-            return [-1, False]
-        return [ans, (self.__l[ans].getName() == name)]
+        ans = self.__ids.get(name, -1)
+        return [ans, ans >= 0]
+    
+    # return the id of the author, or -1 if it doesn't exist
+    def index(self, name):
+        return self.__ids.get(name, -1)
     
     # return length of the author list
     def length(self):
-        return len(self.__l)
+        return len(self.__names)
     
-    # add an author into the list, depending on whether it already exists in the list
-    def add(self, au):
-        name = au.getName()
-        
-        # try to find the author in the list
-        ind = self.find(name)
-        
-        # if it does already exist
-        if (ind[1]):
-            self.__l[ind[0]].extendAuthor(au)
-            return 1
-        
-        # if it doesn't exist, and it should be inserted into the list based on the search result
-        elif (ind[0] < self.length()-1):    
-            self.__l.insert(ind[0]+1, au)
-            return 0
-        # if it doesn't exist, and it should be appended to the end of the list based on the search result
-        else:
-            self.__l.append(au)
-            return 0
+    ##############################################################################
+    # add an author into the list if it doesn't exist yet
+    #
+    # Input:
+    #   name: the author name
+    #
+    # Output:
+    #   1 if the author already existed, 0 if it is new
+    ##############################################################################
+    def add(self, name):
+        ind = self.__ids.get(name, -1)
+        ret = 1
+        # if it doesn't exist, give it the next id
+        if ind < 0:
+            ind = len(self.__names)
+            self.__ids[name] = ind
+            self.__names.append(name)
+            self.__relations.append({})
+            self.__order = None
+            self.__rank = None
+            ret = 0
+        return ret
+    
+    # author ids by ascending dictionary order of author names
+    def ordered(self):
+        if self.__order is None:
+            self.__order = array('l', sorted(range(len(self.__names)), key=self.__names.__getitem__))
+        return self.__order
+    
+    # rank of each author id in ascending dictionary order of author names
+    def ranks(self):
+        order = self.ordered()
+        if self.__rank is None:
+            self.__rank = array('l', [0]) * len(order)
+            for r in range(len(order)):
+                self.__rank[order[r]] = r
+        return self.__rank
     
     # calculate relations for each pair of authors, given all PRs in the dataset, the baseline and deadline time of all PRs
-    def makeRelations(self, PRs, baseline, deadline):
+    # relations are sparse: relations[i] is a dict mapping j to the relation score from author i to author j,
+    # pairs of authors without common network are not stored
+    # relationConst & lam are the two hyperparameters defined in the paper
+    def makeRelations(self, PRs, baseline, deadline, relationConst = 1.0, lam = 0.8):
+        self.__relations = self.buildRelations(PRs, baseline, deadline, relationConst, lam)
+        return self.__relations
+    
+    # same as makeRelations(), but the relations are only returned, leaving the ones of the list unchanged.
+    # Used to compare several relationConst & lam (see sweep.py)
+    def buildRelations(self, PRs, baseline, deadline, relationConst = 1.0, lam = 0.8):
         # author length
         alen = self.length()
         # initiate relation scores
-        self.__relations = [[0.0 for i in range(alen)] for j in range(alen)]
+        relations = [{} for i in range(alen)]
         
-        # two hyperparameters define in the paper
-        relationConst = 1.0
-        lam = 0.8
-        
-        # for each PR
-        for PR in PRs:
-            # [0]: PR   [1]: title   [2]: content    [4]: user_list   [5]: time1     [6]: time2
-            
-            # get involved authors to the PR
-            usrList = []
-            for eachUser in PR[4].split(","):
-                ind = self.find(eachUser)
-                # if the author doesn't exist in the list, there is error in training phase
-                if (ind[1] == False):
-                    print("ERROR",eachUser,ind[0])
-                usrList.append(ind[0])
-            
-            # get numbers of all related authors to the PR
-            L = len(usrList)
+        # for each PR in the PR store (see prStore.py)
+        for i in range(PRs.length()):
+            self.addRelations(PRs.getUsers(i), PRs.getEnd(i), baseline, deadline, relationConst, lam, relations)
             
-            # if only one author, it is the contributor, and as a result no common network is built
-            if L < 2:
-                continue
-            
-            # s_id: the contributor id
-            s_id = usrList[0]
-            
-            # initialize numbers of appreance for each author in this PR
-            cnt = [0] * alen
+        return relations
+    
+    # add the relations built by one PR, given the author ids of its user list, its end time, and the baseline and deadline time of all PRs
+    # relations are added into the given ones, by default the relations of the list
+    def addRelations(self, usrList, endTime, baseline, deadline, relationConst = 1.0, lam = 0.8, relations = None):
+        # get numbers of all related authors to the PR
+        L = len(usrList)
+        
+        # if only one author, it is the contributor, and as a result no common network is built
+        if L < 2:
+            return 0
+        
+        # s_id: the contributor id
+        s_id = usrList[0]
+        
+        # numbers of appreance for each author in this PR
+        cnt = {}
+        
+        # relation scores of the contributor
+        if relations is None:
+            relations = self.__relations
+        relations = relations[s_id]
+        
+        # for each appearance of an author
+        for i in range(L):
+            # the author id
+            t_id = usrList[i]
             
-            # for each appearance of an author
-            for i in range(L):
-                # the author id
-                t_id = usrList[i]
-                
-                # decay parameter by amount of appearance 
-                decay = math.pow(lam, cnt[t_id])
-                cnt[t_id] += 1
-                
-                # calculate common score from all parameters
-                self.__relations[s_id][t_id] += decay * relationConst * calcTime(PR[6], baseline, deadline)
+            # decay parameter by amount of appearance 
+            c = cnt.get(t_id, 0)
+            decay = math.pow(lam, c)
+            cnt[t_id] = c + 1
             
+            # calculate common score from all parameters
+            relations[t_id] = relations.get(t_id, 0.0) + decay * relationConst * calcTime(endTime, baseline, deadline)
+        return 0
+    
+    # relation scores for each pair of authors, as built by makeRelations()
+    def getRelations(self):
+        return self.__relations
+    
+    # replace relation scores by the given ones, e.g. loaded from a saved model. One dict per author
+    def setRelations(self, relations):
+        self.__relations = relations
         return self.__relations
     
     def getName(self, index):
-        return self.__l[index].getName()
+        return self.__names[index]
+    
+    # all author names in id order
+    def getNames(self):
+        return self.__names
        
+    # print author names by ascending dictionary order
     def display(self, leng = 0):
         if (leng == 0):
             leng = self.length()
+        order = self.ordered()
         for i in range(leng):
-            print (self.__l[i].getName())
+            print (self.__names[order[i]])
     
                 
\ No newline at end of file
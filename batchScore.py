@@ -0,0 +1,116 @@
+import expertise
+import metrics
+import optional
+from topk import TopK, topKArray
+
+###############################################################################
+# Batch scoring of a whole test dataset with sparse matrices
+#
+# The vector scores of the training PRs and of the testcases are put into two
+# sparse matrices whose rows are divided by their models, so that a single
+# matrix product gives the cosine similarities of all testcase-PR pairs.
+# The product is computed by chunks of testcases to bound memory.
+#
+# The matrix product sums in a different order than expertise.cos, so its
+# scores may differ in the last bits. It is therefore used to select
+# candidates only: every PR within tolerance of the r-th best score is
+# rescored with expertise.cos before the final top-r selection, which keeps
+# results identical to the one-by-one path in Recommender.test().
+###############################################################################
+
+# tolerance between matrix product scores and exact cosine similarities
+tolerance = 1e-9
+
+# Return True if numpy & scipy are installed, i.e. batch scoring is available
+def available():
+    try:
+        optional.require("numpy", "batch scoring")
+        optional.require("scipy.sparse", "batch scoring")
+    except ImportError:
+        return False
+    return True
+
+###############################################################################
+# Build a sparse matrix from sparse vector scores
+#
+# Input:
+# vectors: list of sparse vector scores (see expertise.py)
+# models: list of models of the vector scores. Rows are divided by them
+# dim: dimension of vector space
+#
+# Output:
+# CSR matrix with one L2-normalised row per vector. A row is left empty if its model is 0
+###############################################################################
+def toMatrix(vectors, models, dim):
+    np = optional.require("numpy", "batch scoring")
+    sparse = optional.require("scipy.sparse", "batch scoring")
+    indptr = np.zeros(len(vectors)+1, dtype=np.int64)
+    nnz = 0
+    for i, vector in enumerate(vectors):
+        if models[i] != 0:
+            nnz += len(vector)
+        indptr[i+1] = nnz
+    indices = np.empty(nnz, dtype=np.int64)
+    data = np.empty(nnz, dtype=np.float64)
+    for i, vector in enumerate(vectors):
+        if models[i] == 0:
+            continue
+        head = indptr[i]
+        indices[head:indptr[i+1]] = list(vector.keys())
+        data[head:indptr[i+1]] = list(vector.values())
+        data[head:indptr[i+1]] /= models[i]
+    return sparse.csr_matrix((data, indices, indptr), shape=(len(vectors), dim))
+
+###############################################################################
+# Find the r closest training PRs for every testcase
+#
+# Input:
+# vectorScore, vectorModel: sparse vector scores of training PRs & their models
+# testScores, testModels: sparse vector scores of testcases & their models
+# dim: dimension of vector space
+# r: number of closest PRs needed
+# minRel: minimum cosine similarity of a related PR
+# chunk: number of testcases scored by each matrix product
+# trainMatrix: trainingMatrix() of the training PRs, if already built
+#
+# Output:
+# topRs: one list per testcase of at most r [score, ind] pairs, by descending score
+#        then ascending ind. Same as the selection in Recommender.test()
+###############################################################################
+def topSimilar(vectorScore, vectorModel, testScores, testModels, dim, r, minRel, chunk = 256, trainMatrix = None):
+    if trainMatrix is None:
+        trainMatrix = trainingMatrix(vectorScore, vectorModel, dim)
+    testMatrix = toMatrix(testScores, testModels, dim)
+    topRs = []
+    for head in range(0, len(testScores), chunk):
+        sims = (testMatrix[head:head+chunk] @ trainMatrix).toarray()
+        for row in range(sims.shape[0]):
+            q = head + row
+            topRs.append(selectTopR(sims[row], vectorScore, vectorModel, testScores[q], testModels[q], r, minRel))
+    return topRs
+
+# matrix of the training PRs used by topSimilar(), with one column per PR.
+# It can be kept to score several batches of testcases against the same training PRs
+def trainingMatrix(vectorScore, vectorModel, dim):
+    return toMatrix(vectorScore, vectorModel, dim).T.tocsr()
+
+# select the exact top-r of one testcase from its matrix product scores
+def selectTopR(sims, vectorScore, vectorModel, testScore, testModel, r, minRel):
+    np = optional.require("numpy", "batch scoring")
+    # score threshold of candidates: the r-th best approximate score, and minRel
+    threshold = minRel
+    if len(sims) > r > 0:
+        threshold = max(threshold, topKArray(r, sims, -np.inf)[-1][0])
+    candidates = np.flatnonzero((sims >= threshold - tolerance) & (sims != 0))
+    if metrics.enabled:
+        metrics.count("queries")
+        metrics.count("candidates", len(candidates))
+        metrics.count("nonzeroSimilarities", int(np.count_nonzero(sims)))
+    
+    # rescore candidates exactly
+    topR = TopK(r)
+    for i in candidates.tolist():
+        score = expertise.cos(vectorScore[i], testScore, vectorModel[i], testModel)
+        if score >= minRel:
+            topR.push(score, i)
+    return topR.result()
@@ -0,0 +1,225 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# resource is not available on every platform. Peak RSS is then not reported
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from recommender import Recommender, raiseFieldSizeLimit, parseTime
+import evaluate
+import ingest
+import textClean
+import vectorSpace
+
+###############################################################################
+# Benchmark suite
+#
+# Times every stage of the recommender on the projects of ./archive/, and on
+# synthetic corpora made by scaling up their training datasets:
+#
+#   csvRead: read PR rows of both datasets          nltkLoad: import of NLTK tokenizer & stemmer
+#   tokenize: word_tokenize of the PRs              stem: stem & stopwords of the tokens (cold cache)
+#   train: whole Recommender.train()                tfidf: vectorSpace.tfidfTerms of training PRs
+#   makeRelations: common network scores            similarity: closest PRs of every testcase
+#   topK: ranking of authors of every testcase      test: whole Recommender.test()
+#
+# Each run reports seconds & PRs/s per stage, the peak RSS of its process and
+# the counters of the test as a checksum of the results. Runs are done one at
+# a time, each in a new process, so their peak RSS are independent.
+#
+# Results are written as JSON. Given the JSON of a previous run as baseline,
+# stages slower by more than the threshold, or a different checksum, are
+# reported and make the suite exit with status 1.
+###############################################################################
+
+# stages in the order they are run
+stages = ["csvRead", "nltkLoad", "tokenize", "stem", "train", "tfidf", "makeRelations", "similarity", "topK", "test"]
+
+# stages faster than this in the baseline are too noisy to be compared
+minSeconds = 0.05
+
+# peak RSS of this process in bytes, or None if unknown
+def peakRSS():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+# write a training dataset made of scale copies of the PRs of file. Copies follow each other in time
+def scaleDataset(file, scale, output):
+    rows = list(ingest.readPRs(file))
+    times = [parseTime(row[5]) for row in rows] + [parseTime(row[6]) for row in rows]
+    span = (max(times) - min(times) + 24 * 3600) if times else 0
+    with open(output, "w", newline="") as f:
+        writer = csv.writer(f)
+        for copy in range(scale):
+            for row in rows:
+                shift = copy * span
+                writer.writerow(row[:5] + [formatTime(parseTime(row[5]) + shift), formatTime(parseTime(row[6]) + shift)] + row[7:])
+    return output
+
+def formatTime(seconds):
+    return time.strftime("%Y-%m-%d %X", time.localtime(seconds))
+
+# time a function. Return [seconds, its result]
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return [time.perf_counter() - start, result]
+
+##############################################################################
+# Benchmark one project
+#
+# Input:
+#   name: name of the run
+#   trainFile, testFile: datasets of the project
+#
+# Output:
+#   dict with the number of PRs of both datasets, seconds & PRs/s of every
+#   stage, peak RSS in bytes and the counters [predictCnt, correctCnt, actualCnt]
+##############################################################################
+def benchProject(name, trainFile, testFile):
+    raiseFieldSizeLimit()
+    seconds = {}
+
+    # reading & cleaning the PRs of both datasets
+    seconds["csvRead"], [trainRows, testRows] = timed(lambda: [list(ingest.readPRs(trainFile)), list(ingest.readPRs(testFile))])
+    rows = trainRows + testRows
+    # NLTK is imported on first use (see textClean.py). Load it apart, so that tokenize & stem only time the PRs
+    seconds["nltkLoad"] = timed(lambda: [textClean.nltkTokenize(""), textClean.stemmer(), textClean.stopwords()])[0]
+    seconds["tokenize"], tokens = timed(lambda: [textClean.tokenize(row[1], row[2]) for row in rows])
+    textClean.clearCache()
+    seconds["stem"] = timed(lambda tokens: [textClean.cleanTokens(words) for words in tokens], tokens)[0]
+    del tokens
+
+    # training stages. train() is timed from a cold cache too
+    recommender = Recommender()
+    textClean.clearCache()
+    seconds["train"] = timed(recommender.train, trainFile)[0]
+    PRs = recommender.PRs
+    seconds["tfidf"] = timed(vectorSpace.tfidfTerms, [PRs.getTerms(i) for i in range(len(PRs))], recommender.vectorBase, len(PRs))[0]
+    seconds["makeRelations"] = timed(recommender.authors.buildRelations, PRs, recommender.baseline, recommender.deadline)[0]
+
+    # testing stages, on the legal testcases
+    testcases = [[dedic[0], [testScore, testModel]] for dedic, testScore, testModel in recommender.testcases(ingest.records(testFile))]
+    seconds["similarity"], topRs = timed(lambda: [recommender.similarPRs(testScore, testModel) for contributor, [testScore, testModel] in testcases])
+    seconds["topK"] = timed(lambda: [recommender.rankAuthors(topR, each[0]) for each, topR in zip(testcases, topRs)])[0]
+    seconds["test"], counts = timed(recommender.test, testFile)
+
+    # number of PRs processed by each stage
+    trainSize = len(trainRows)
+    testSize = len(testRows)
+    processed = {"csvRead": len(rows), "nltkLoad": 0, "tokenize": len(rows), "stem": len(rows), "train": trainSize, "tfidf": len(PRs),
+                 "makeRelations": len(PRs), "similarity": len(testcases), "topK": len(testcases), "test": testSize}
+
+    report = {"name": name, "trainPRs": trainSize, "testPRs": testSize, "stages": {}}
+    for stage in stages:
+        report["stages"][stage] = {"seconds": seconds[stage], "PRsPerSecond": processed[stage] / seconds[stage] if processed[stage] and seconds[stage] > 0 else None}
+    report["peakRSS"] = peakRSS()
+    report["counts"] = counts
+    report["precision"] = float(counts[1])/counts[0] if counts[0] else 0.0
+    report["recall"] = float(counts[1])/counts[2] if counts[2] else 0.0
+    return report
+
+# benchmark a project with its training dataset scaled up. The scaled dataset is removed afterwards
+def benchScaled(name, trainFile, testFile, scale):
+    folder = tempfile.mkdtemp(prefix="bench")
+    try:
+        scaled = scaleDataset(trainFile, scale, os.path.join(folder, "training_data.csv"))
+        return benchProject(name, scaled, testFile)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+# run a benchmark in a new process, so that its peak RSS is its own
+def isolated(function, *args):
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(function, *args).result()
+
+##############################################################################
+# Compare a result to a baseline
+#
+# Output:
+#   list of messages about runs & stages slower than (1 + threshold) times the
+#   baseline, and runs whose counters changed. Empty if there is no regression
+##############################################################################
+def compare(result, baseline, threshold = 0.25):
+    messages = []
+    previous = {run["name"]: run for run in baseline["runs"]}
+    for run in result["runs"]:
+        old = previous.get(run["name"])
+        if old is None:
+            continue
+        if run["counts"] != old["counts"]:
+            messages.append("%s: counters %s instead of %s" % (run["name"], run["counts"], old["counts"]))
+        for stage in stages:
+            if stage not in old["stages"]:
+                continue
+            before = old["stages"][stage]["seconds"]
+            after = run["stages"][stage]["seconds"]
+            if before >= minSeconds and after > before * (1 + threshold):
+                messages.append("%s: %s took %.3fs instead of %.3fs (+%.0f%%)" % (run["name"], stage, after, before, 100.0 * (after / before - 1)))
+    return messages
+
+# one line per run & stage
+def formatResult(result):
+    lines = ["\t".join(["run", "stage", "seconds", "PRs/s"])]
+    for run in result["runs"]:
+        for stage in stages:
+            each = run["stages"][stage]
+            lines.append("\t".join([run["name"], stage, "%.4f" % each["seconds"], "%.1f" % (each["PRsPerSecond"] or 0.0)]))
+        lines.append("\t".join([run["name"], "peakRSS", str(run["peakRSS"]), ""]))
+        lines.append("\t".join([run["name"], "checksum", "%s P=%.6f R=%.6f" % (run["counts"], run["precision"], run["recall"]), ""]))
+    return lines
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the stages of the recommender on the projects of ./archive/")
+    parser.add_argument("--projects", default=None, help="comma separated names of projects to run (default: all)")
+    parser.add_argument("--scale", default="", help="comma separated factors of synthetic training datasets, made of that many copies of each training dataset, e.g. 2,4")
+    parser.add_argument("--output", default=None, help="write the results into this JSON file")
+    parser.add_argument("--baseline", default=None, help="JSON file of a previous run. Exit with status 1 if a stage is slower or the results changed")
+    parser.add_argument("--threshold", type=float, default=0.25, help="slowdown tolerated against the baseline, as a fraction (default: 0.25)")
+    args = parser.parse_args()
+
+    raiseFieldSizeLimit()
+    folders = evaluate.listProjects("./archive/")
+    if args.projects:
+        names = args.projects.split(",")
+        folders = [each for each in folders if os.path.basename(each) in names]
+    scales = [int(each) for each in args.scale.split(",") if each]
+
+    result = {"python": platform.python_version(), "platform": platform.platform(), "time": time.strftime("%Y-%m-%d %X"), "runs": []}
+    for folder in folders:
+        name = os.path.basename(folder)
+        trainFile = os.path.join(folder, "training_data.csv")
+        testFile = os.path.join(folder, "testing_data.csv")
+        result["runs"].append(isolated(benchProject, name, trainFile, testFile))
+        for scale in scales:
+            result["runs"].append(isolated(benchScaled, "%s x%d" % (name, scale), trainFile, testFile, scale))
+
+    for line in formatResult(result):
+        print (line)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        messages = compare(result, baseline, args.threshold)
+        for message in messages:
+            print ("REGRESSION", message)
+        if messages:
+            sys.exit(1)
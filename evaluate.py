@@ -0,0 +1,212 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from recommender import Recommender, raiseFieldSizeLimit
+import modelStore
+import sweep
+import lsh
+import ingest
+import metrics
+import textClean
+import rolling
+
+###############################################################################
+# Evaluation of the recommender over several projects
+#
+# Every project is trained (or loaded from a saved model) and tested by its
+# own Recommender, so projects can run on a pool of processes. Counters are
+# returned in the order of the input projects, whatever order they finish in.
+###############################################################################
+
+# run a function on every project in a pool of processes. Return the results in input order
+def mapProjects(run, projects, processes = None):
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, len(projects))
+    if processes <= 1:
+        return [run(project) for project in projects]
+    with ProcessPoolExecutor(max_workers=processes, initializer=initWorker, initargs=(textClean.getTokenizer(),)) as pool:
+        return list(pool.map(run, projects))
+
+# prepare a worker process: workers use the tokenizer of the main process
+def initWorker(tokenizer = "nltk"):
+    raiseFieldSizeLimit()
+    textClean.setTokenizer(tokenizer)
+
+# Get all project folders in the given folder
+def listProjects(file_dir = "./archive/"):
+    reviews = []
+    for root, dirs, files in os.walk(file_dir):
+        for d in dirs:
+            reviews.append(os.path.join(root, d))
+    return reviews
+
+# Train & test one project folder. Return [predictCnt, correctCnt, actualCnt]
+# ann: [bits, tables, probes] to find the closest PRs by approximate search (see lsh.py), None for exact search
+def evaluateProject(project, modelDir = "./models/", retrain = False, batch = False, ann = None):
+    recommender = Recommender()
+    recommender.loadOrTrain(os.path.join(project, "training_data.csv"), modelDir, retrain)
+    if ann is not None:
+        recommender.useANN(*ann)
+    return recommender.test(os.path.join(project, "testing_data.csv"), batch)
+
+##############################################################################
+# Evaluate projects in parallel
+#
+# Input:
+#   projects: list of project folders
+#   processes: number of worker processes. 1 runs everything in this process
+#   the other arguments are passed to evaluateProject()
+#
+# Output:
+#   list of [predictCnt, correctCnt, actualCnt], one per project in input order
+##############################################################################
+def evaluateProjects(projects, processes = None, modelDir = "./models/", retrain = False, batch = False, ann = None):
+    run = partial(evaluateProject, modelDir=modelDir, retrain=retrain, batch=batch, ann=ann)
+    return mapProjects(run, projects, processes)
+
+##############################################################################
+# Evaluate one project with metrics collected (see metrics.py)
+#
+# profileDir: if given, cProfile stats of the project are written into it,
+# and the top allocations of tracemalloc too if memory is True
+#
+# Output:
+#   [counts, snapshot]: counters of evaluateProject() & the metrics of the project
+##############################################################################
+def evaluateProjectMetered(project, modelDir = "./models/", retrain = False, batch = False, ann = None, profileDir = None, memory = False):
+    if profileDir is None:
+        return metered(evaluateProject, project, modelDir, retrain, batch, ann)
+    with metrics.profiled(os.path.basename(os.path.normpath(project)), profileDir, True, memory):
+        return metered(evaluateProject, project, modelDir, retrain, batch, ann)
+
+# call a function with metrics collected from scratch. Return [its result, the metrics of the call]
+def metered(function, *args):
+    metrics.reset()
+    metrics.enable()
+    before = textClean.cacheStats()
+    result = function(*args)
+    after = textClean.cacheStats()
+    metrics.count("stemCacheHits", after["hits"] - before["hits"])
+    metrics.count("stemCacheMisses", after["misses"] - before["misses"])
+    return [result, metrics.snapshot()]
+
+# evaluate projects in parallel like evaluateProjects(), with metrics collected.
+# Return the counters of every project in input order. Metrics of all projects are merged into the metrics of this process
+def evaluateProjectsMetered(projects, processes = None, modelDir = "./models/", retrain = False, batch = False, ann = None, profileDir = None, memory = False):
+    run = partial(evaluateProjectMetered, modelDir=modelDir, retrain=retrain, batch=batch, ann=ann, profileDir=profileDir, memory=memory)
+    results = mapProjects(run, projects, processes)
+    metrics.reset()
+    for counts, snapshot in results:
+        metrics.merge(snapshot)
+    return [counts for counts, snapshot in results]
+
+# Recommender of a worker process testing chunks of a project. Loaded once by initTestWorker()
+workerRecommender = None
+
+# load the saved model of the project in a worker process. The model file is
+# memory-mapped, so all workers share its pages instead of receiving a copy
+def initTestWorker(path, source, ann = None, tokenizer = "nltk"):
+    global workerRecommender
+    initWorker(tokenizer)
+    workerRecommender = Recommender()
+    if not workerRecommender.load(path, source):
+        raise RuntimeError("cannot load model " + path)
+    if ann is not None:
+        workerRecommender.useANN(*ann)
+
+# test one chunk of a test dataset in a worker process
+def testChunk(file, batch, chunks, chunk):
+    return workerRecommender.test(file, batch, chunk, chunks)
+
+# same as testChunk(), with metrics collected. Return [counts, snapshot]
+def testChunkMetered(file, batch, chunks, chunk):
+    return metered(testChunk, file, batch, chunks, chunk)
+
+##############################################################################
+# Evaluate one project by splitting its test dataset into chunks scored in parallel
+#
+# The model is trained (or loaded) once and saved into modelDir, then every
+# worker process memory-maps the saved model. Testcases are assigned to
+# chunks round-robin, and chunk counters are summed at the end.
+#
+# snapshots: if a list is given, metrics of training & of every chunk are
+# collected, and their snapshots appended to it (see metrics.merge())
+#
+# Output:
+#   [predictCnt, correctCnt, actualCnt] of the project, same as evaluateProject()
+##############################################################################
+def evaluateProjectSplit(project, processes = None, chunks = None, modelDir = "./models/", retrain = False, batch = False, ann = None, snapshots = None):
+    file = os.path.join(project, "training_data.csv")
+    testFile = os.path.join(project, "testing_data.csv")
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if chunks is None:
+        chunks = processes
+    
+    # make sure an up-to-date model is saved for the workers
+    if snapshots is None:
+        Recommender().loadOrTrain(file, modelDir, retrain)
+    else:
+        snapshots.append(metered(Recommender().loadOrTrain, file, modelDir, retrain)[1])
+    path = modelStore.modelPath(modelDir, file)
+    source = modelStore.fileHash(file)
+    
+    with ProcessPoolExecutor(max_workers=processes, initializer=initTestWorker, initargs=(path, source, ann, textClean.getTokenizer())) as pool:
+        if snapshots is None:
+            counts = list(pool.map(partial(testChunk, testFile, batch, chunks), range(chunks)))
+        else:
+            results = list(pool.map(partial(testChunkMetered, testFile, batch, chunks), range(chunks)))
+            counts = [each for each, snapshot in results]
+            snapshots.extend(snapshot for each, snapshot in results)
+    return mergeCounts(counts)
+
+# merge counters of several projects or chunks into one [predictCnt, correctCnt, actualCnt]
+def mergeCounts(counts):
+    total = [0, 0, 0]
+    for each in counts:
+        for i in range(3):
+            total[i] += each[i]
+    return total
+
+# Train (or load) one project & test it for every configuration of the grids (see sweep.py)
+# Return a dict mapping (K, r, relationConst, lam) to [predictCnt, correctCnt, actualCnt]
+def sweepProject(project, Ks, rs, relationConsts = (1.0,), lams = (0.8,), modelDir = "./models/", retrain = False):
+    recommender = Recommender()
+    recommender.loadOrTrain(os.path.join(project, "training_data.csv"), modelDir, retrain)
+    return sweep.sweep(recommender, os.path.join(project, "testing_data.csv"), Ks, rs, relationConsts, lams)
+
+# sweep projects in parallel, like evaluateProjects(). Return the results of sweepProject() in input order
+def sweepProjects(projects, Ks, rs, relationConsts = (1.0,), lams = (0.8,), processes = None, modelDir = "./models/", retrain = False):
+    run = partial(sweepProject, Ks=Ks, rs=rs, relationConsts=relationConsts, lams=lams, modelDir=modelDir, retrain=retrain)
+    return mapProjects(run, projects, processes)
+
+# Train (or load) one project & compare approximate search with [bits, tables, probes] to exact search on its test dataset
+# Return the report of lsh.compare()
+def compareANNProject(project, ann, modelDir = "./models/", retrain = False):
+    recommender = Recommender()
+    recommender.loadOrTrain(os.path.join(project, "training_data.csv"), modelDir, retrain)
+    recommender.useANN(*ann)
+    return lsh.compare(recommender, ingest.records(os.path.join(project, "testing_data.csv")))
+
+# compare approximate & exact search of projects in parallel, like evaluateProjects(). Return the reports in input order
+def compareANNProjects(projects, ann, processes = None, modelDir = "./models/", retrain = False):
+    run = partial(compareANNProject, ann=ann, modelDir=modelDir, retrain=retrain)
+    return mapProjects(run, projects, processes)
+
+# Replay all PRs of one project in time order (see rolling.py). Return the report of rolling.replay(),
+# with the seconds spent reading & cleaning the PRs as timelineSeconds, and both together as totalSeconds
+def rollingProject(project, window = None, warmup = 0):
+    start = time.perf_counter()
+    events = rolling.timeline([os.path.join(project, "training_data.csv"), os.path.join(project, "testing_data.csv")])
+    timelineSeconds = time.perf_counter() - start
+    report = rolling.replay(events, window, warmup)
+    report["timelineSeconds"] = timelineSeconds
+    report["totalSeconds"] = timelineSeconds + report["seconds"]
+    return report
+
+# replay projects in parallel, like evaluateProjects(). Return the reports in input order
+def rollingProjects(projects, window = None, warmup = 0, processes = None):
+    return mapProjects(partial(rollingProject, window=window, warmup=warmup), projects, processes)
@@ -1,17 +1,29 @@
 import math
 
+###############################################################################
+# Vector scores are sparse: a dict mapping the index of a word in the vector
+# space to its (non-zero) tfidf value, with keys in ascending index order.
+# Dimensions that are absent are 0.0, so the cost of each function below
+# depends on the number of words in the PRs, not on the size of vector space.
+###############################################################################
+
 # vector model
 def model(lis):
     sum = 0.0
-    for each in lis:
-        sum += float(each)*float(each)
+    for each in lis.values():
+        sum += each*each
     return math.sqrt(sum)
 
-# vector dot
+# vector dot. Only dimensions shared by both vectors contribute
 def dot(lis1, lis2):
+    # walk the shorter vector and look up the longer one
+    if len(lis1) > len(lis2):
+        lis1, lis2 = lis2, lis1
     sum = 0.0
-    for a, b in zip(lis1, lis2):
-        sum += float(a) * float(b)
+    for ind, a in lis1.items():
+        b = lis2.get(ind)
+        if b is not None:
+            sum += a * b
     return sum
 
 def cos(lis1, lis2, mod1 = 0, mod2 = 0):
@@ -19,4 +31,4 @@ def cos(lis1, lis2, mod1 = 0, mod2 = 0):
         mod1 = model(lis1)
     if mod2 == 0:
         mod2 = model(lis2)
-    return dot(lis1, lis2)/(mod1*mod2)
\ No newline at end of file
+    return dot(lis1, lis2)/(mod1*mod2)
@@ -0,0 +1,64 @@
+import csv, sys
+
+import textClean
+import metrics
+
+###############################################################################
+# Streaming ingestion of datasets
+#
+# A dataset is read as a pipeline of generators:
+#   readPRs -> selectChunk -> cleanPRs
+# Each stage yields one PR at a time, so only one raw row is alive at any
+# moment, and title & content are dropped as soon as they are tokenized.
+# Datasets larger than memory, or arriving on stdin ("-"), are fine.
+#
+# A cleaned PR is a compact record:
+#   [pairs, user_list, start_time, end_time]
+# pairs being the [word, stem] pairs of the words kept (see textClean.cleanTokens)
+###############################################################################
+
+# open a dataset given a path, "-" for stdin, or an open file
+def openSource(file):
+    if hasattr(file, "read"):
+        return file
+    if file == "-":
+        return sys.stdin
+    return open(file, 'r', errors='ignore')
+
+# yield the rows of a dataset that are PRs
+def readPRs(file):
+    f = openSource(file)
+    try:
+        for row in csv.reader(f):
+            # if the line is not PR, skip
+            if len(row) > 0 and row[0] == "PR":
+                yield row
+    finally:
+        # only close files opened here
+        if f is not file and f is not sys.stdin:
+            f.close()
+
+# yield the n-th rows with n % chunks == chunk
+def selectChunk(rows, chunk = 0, chunks = 1):
+    for n, row in enumerate(rows):
+        if n % chunks == chunk:
+            yield row
+
+# clean one PR into a compact record
+def makeRecord(title, content, users, startTime, endTime):
+    # Get title & content of the PR. And merge them. Stopwords are removed
+    words = textClean.tokenize(title, content)
+    if metrics.enabled:
+        metrics.count("PRsCleaned")
+        metrics.count("tokens", len(words))
+    return [textClean.cleanTokens(words), users, startTime, endTime]
+
+# yield compact records of PR rows
+# PR attributes: [0]: PR  [1]: title  [2]: content  [4]: user_list  [5]: start_time  [6]: end_time
+def cleanPRs(rows):
+    for row in rows:
+        yield makeRecord(row[1], row[2], row[4], row[5], row[6])
+
+# yield compact records of the PRs of a dataset, or of one chunk of them
+def records(file, chunk = 0, chunks = 1):
+    return cleanPRs(selectChunk(readPRs(file), chunk, chunks))
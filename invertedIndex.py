@@ -0,0 +1,192 @@
+import heapq
+from array import array
+
+import expertise
+import metrics
+
+###############################################################################
+# Inverted index of the vector scores of all PRs in the training dataset
+#
+# For every word (index in vector space) the index keeps a postings list of
+# the PRs containing the word, together with the tfidf value of the word in
+# the PR divided by the model of the PR vector. The smallest & largest of these
+# values are kept per word to bound its contribution to a cosine score.
+#
+# Searching only visits PRs sharing at least one word with the query.
+# Words are visited by descending upper bound (max-score): once the bound of
+# all remaining words is below the r-th best partial score, no PR that has not
+# been met yet can make it into the top-r, and the remaining postings are skipped.
+# Candidates are then scored exactly with expertise.cos.
+#
+# Weights can be negative: the document frequency of a stem counts its variants
+# within one PR and PRs dropped by training, so it can exceed the number of PRs
+# and make log(N/df) negative. Words whose contribution can be negative are
+# visited first, without pruning: partial scores are lower bounds of the exact
+# ones only once every remaining word adds a non-negative amount.
+###############################################################################
+class InvertedIndex(object):
+
+    # tolerance on the upper bounds, which are summed in a different order than exact scores
+    __eps = 1e-12
+
+    # postings can be given as arrays from getArrays() instead of being built from the vector scores
+    def __init__(self, vectorScore, vectorModel, postings = None):
+        # vector scores and their models of all PRs, used for exact scoring
+        self.__vectors = vectorScore
+        self.__models = vectorModel
+        # index in vector space -> PR ids & normalised tfidf values
+        self.__postingIds = {}
+        self.__postingWeights = {}
+        # index in vector space -> minimum & maximum normalised tfidf values
+        self.__minWeight = {}
+        self.__maxWeight = {}
+        if postings is not None:
+            self.setArrays(*postings)
+            return
+        for i in range(len(vectorScore)):
+            self.add(i, vectorScore[i], vectorModel[i])
+
+    # add the i-th PR into the index
+    def add(self, i, vector, mod):
+        if mod == 0:
+            return
+        for ind, w in vector.items():
+            if w == 0:
+                continue
+            nw = w / mod
+            if ind not in self.__postingIds:
+                self.__postingIds[ind] = array('l')
+                self.__postingWeights[ind] = array('d')
+                self.__minWeight[ind] = nw
+                self.__maxWeight[ind] = nw
+            elif nw > self.__maxWeight[ind]:
+                self.__maxWeight[ind] = nw
+            elif nw < self.__minWeight[ind]:
+                self.__minWeight[ind] = nw
+            self.__postingIds[ind].append(i)
+            self.__postingWeights[ind].append(nw)
+
+    ##############################################################################
+    # Flatten the postings into arrays, e.g. to be saved by modelStore.py
+    #
+    # Output:
+    #   [terms, minWeights, maxWeights, offsets, ids, weights]
+    #   the postings of terms[t] are ids & weights from offsets[t] to offsets[t+1]
+    ##############################################################################
+    def getArrays(self):
+        terms = array('l', sorted(self.__postingIds))
+        minWeights = array('d')
+        maxWeights = array('d')
+        offsets = array('l', [0])
+        ids = array('l')
+        weights = array('d')
+        for ind in terms:
+            minWeights.append(self.__minWeight[ind])
+            maxWeights.append(self.__maxWeight[ind])
+            ids.extend(self.__postingIds[ind])
+            weights.extend(self.__postingWeights[ind])
+            offsets.append(len(ids))
+        return [terms, minWeights, maxWeights, offsets, ids, weights]
+
+    # replace the postings by the ones in arrays from getArrays(). Arrays may be memoryviews
+    def setArrays(self, terms, minWeights, maxWeights, offsets, ids, weights):
+        self.__postingIds = {}
+        self.__postingWeights = {}
+        self.__minWeight = {}
+        self.__maxWeight = {}
+        for t in range(len(terms)):
+            ind = terms[t]
+            self.__postingIds[ind] = ids[offsets[t]:offsets[t+1]]
+            self.__postingWeights[ind] = weights[offsets[t]:offsets[t+1]]
+            self.__minWeight[ind] = minWeights[t]
+            self.__maxWeight[ind] = maxWeights[t]
+
+    # number of PRs containing the word with given index in vector space
+    def postingLength(self, ind):
+        ids = self.__postingIds.get(ind)
+        return 0 if ids is None else len(ids)
+
+    ##############################################################################
+    # Find PRs that may be among the r closest ones to the query
+    #
+    # Input:
+    #   query: sparse vector score of the query
+    #   queryModel: model of the query vector
+    #   r: number of closest PRs needed
+    #   minRel: minimum cosine similarity of a related PR
+    #
+    # Output:
+    #   list of [score, ind] of the candidates whose cosine similarity is at least
+    #   minRel, in ascending order of ind. It contains the top-r closest PRs.
+    ##############################################################################
+    def search(self, query, queryModel, r, minRel):
+        if r <= 0:
+            return []
+        # bounds of the contribution of each query word to a cosine score
+        terms = []
+        for ind, w in query.items():
+            if ind in self.__maxWeight:
+                qw = w / queryModel
+                low = min(qw * self.__minWeight[ind], qw * self.__maxWeight[ind])
+                bound = max(qw * self.__minWeight[ind], qw * self.__maxWeight[ind])
+                terms.append((low < 0, bound, ind, qw))
+        # words which can add a negative amount first, then by descending upper bound
+        terms.sort(key=lambda t: (not t[0], -t[1]))
+        remaining = 0.0
+        for t in terms:
+            remaining += t[1]
+        
+        # lower bounds of cosine similarities of the candidates met so far, once no negative word remains
+        partial = {}
+        # the best r candidates as a min-heap of [score, i]. Entries whose score
+        # is not top[i] any more are stale, and skipped when they come first
+        heap = None
+        top = {}
+        for negative, bound, ind, qw in terms:
+            if not negative:
+                if heap is None:
+                    heap = [[score, i] for i, score in partial.items()]
+                    heap = heapq.nlargest(r, heap)
+                    heapq.heapify(heap)
+                    top = {i: score for score, i in heap}
+                # no PR outside the candidates can be related, or reach the top-r any more
+                threshold = minRel
+                if len(top) >= r:
+                    while heap[0][0] != top.get(heap[0][1]):
+                        heapq.heappop(heap)
+                    threshold = max(threshold, heap[0][0])
+                if remaining < threshold - self.__eps:
+                    break
+            for i, nw in zip(self.__postingIds[ind], self.__postingWeights[ind]):
+                score = partial.get(i, 0.0) + qw * nw
+                partial[i] = score
+                if heap is not None:
+                    self.__offer(heap, top, r, i, score)
+            remaining -= bound
+        
+        # exact cosine similarities of the candidates
+        if metrics.enabled:
+            metrics.count("candidates", len(partial))
+        result = []
+        for i in sorted(partial):
+            score = expertise.cos(self.__vectors[i], query, self.__models[i], queryModel)
+            if score >= minRel:
+                result.append([score, i])
+        return result
+
+    # keep the r best partial scores, which only grow, in heap & top
+    def __offer(self, heap, top, r, i, score):
+        if i in top:
+            top[i] = score
+            heapq.heappush(heap, [score, i])
+            return
+        if len(top) < r:
+            top[i] = score
+            heapq.heappush(heap, [score, i])
+            return
+        while heap[0][0] != top.get(heap[0][1]):
+            heapq.heappop(heap)
+        if score > heap[0][0]:
+            del top[heapq.heappop(heap)[1]]
+            top[i] = score
+            heapq.heappush(heap, [score, i])
@@ -0,0 +1,147 @@
+import itertools
+import time
+
+import expertise
+import metrics
+import optional
+
+###############################################################################
+# Approximate nearest neighbour search of PRs by random-projection LSH (SimHash)
+#
+# Every vector score is projected on tables*bits random hyperplanes. The signs
+# of the projections on the bits hyperplanes of a table give the code of the
+# vector in that table: two vectors share a code with a probability growing
+# with their cosine similarity. PRs sharing a code with the testcase in any
+# table, or a code within `probes` flipped bits of it, are the candidates. Only
+# candidates are scored, with expertise.cos, so the scores returned are exact
+# but the closest PRs can be missed.
+#
+# bits: more bits give smaller buckets, i.e. faster but lower recall
+# tables: more tables give more candidates, i.e. higher recall but slower
+# probes: number of flipped bits of the codes also looked up in each table
+#
+# Hyperplanes are drawn per term from the seed, so a PR keeps its codes when
+# the vector space grows.
+#
+# The defaults find 94-98% of the exact closest PRs on k9, jquery & node, by
+# scoring about 70% of their PRs. With a few thousand PRs, as in ./archive/,
+# the exact inverted index is as fast or faster: approximate search only pays
+# for much larger training datasets.
+###############################################################################
+
+# default [bits, tables, probes]
+defaultParams = [8, 32, 1]
+
+class SimHashIndex(object):
+
+    def __init__(self, vectorScore, vectorModel, bits = defaultParams[0], tables = defaultParams[1], probes = defaultParams[2], seed = 0):
+        np = optional.require("numpy", "approximate search")
+        self.__vectorScore = vectorScore
+        self.__vectorModel = vectorModel
+        self.__bits = bits
+        self.__tables = tables
+        self.__probes = probes
+        self.__seed = seed
+        # hyperplanes[t] is the column of term t in all the tables*bits hyperplanes
+        self.__hyperplanes = np.empty((0, tables*bits))
+        # weights of the bits of a code
+        self.__powers = 1 << np.arange(bits, dtype=np.int64)
+        # buckets[table] maps a code to the list of PRs having it
+        self.__buckets = [{} for t in range(tables)]
+        # code offsets looked up around the code of a testcase, nearest first
+        self.__flips = [0]
+        for d in range(1, probes+1):
+            for each in itertools.combinations(range(bits), d):
+                self.__flips.append(sum(1 << b for b in each))
+        for i in range(len(vectorScore)):
+            self.add(i, vectorScore[i], vectorModel[i])
+
+    def getParams(self):
+        return {"bits": self.__bits, "tables": self.__tables, "probes": self.__probes, "seed": self.__seed}
+
+    # make sure there are hyperplanes for all terms below dim
+    def __grow(self, dim):
+        have = self.__hyperplanes.shape[0]
+        if dim <= have:
+            return 0
+        dim = max(dim, 2*have)
+        np = optional.require("numpy", "approximate search")
+        rows = [np.random.default_rng([self.__seed, t]).standard_normal(self.__tables*self.__bits) for t in range(have, dim)]
+        self.__hyperplanes = np.vstack([self.__hyperplanes] + rows)
+        return 0
+
+    # codes of a sparse vector score in every table
+    def codes(self, vector):
+        if len(vector) == 0:
+            return [0]*self.__tables
+        self.__grow(max(vector) + 1)
+        np = optional.require("numpy", "approximate search")
+        projection = np.asarray(list(vector.values())) @ self.__hyperplanes[list(vector.keys())]
+        signs = (projection > 0).reshape(self.__tables, self.__bits)
+        return (signs @ self.__powers).tolist()
+
+    # add the i-th PR into the index, given its vector score & its model
+    def add(self, i, vector, mod):
+        if mod == 0:
+            return 0
+        for table, code in zip(self.__buckets, self.codes(vector)):
+            table.setdefault(code, []).append(i)
+        return 0
+
+    # PRs sharing a bucket with the query in any table, in ascending order
+    def candidates(self, query):
+        found = set()
+        for table, code in zip(self.__buckets, self.codes(query)):
+            for flip in self.__flips:
+                found.update(table.get(code ^ flip, ()))
+        return sorted(found)
+
+    # same interface as InvertedIndex.search(): [score, i] of the candidates scoring at least minRel, in ascending i order
+    def search(self, query, queryModel, r, minRel):
+        result = []
+        candidates = self.candidates(query)
+        if metrics.enabled:
+            metrics.count("candidates", len(candidates))
+        for i in candidates:
+            score = expertise.cos(self.__vectorScore[i], query, self.__vectorModel[i], queryModel)
+            if score >= minRel:
+                result.append([score, i])
+        return result
+
+##############################################################################
+# Compare approximate & exact search on a test dataset
+#
+# Input:
+#   recommender: a trained Recommender using approximate search (see Recommender.useANN())
+#   records: cleaned PRs of the test dataset (see ingest.records())
+#
+# Output:
+#   dict of
+#     exact, approximate: [predictCnt, correctCnt, actualCnt] of both paths
+#     recall: fraction of the exact top-r PRs also found by approximate search
+#     candidates: average number of PRs scored per testcase by approximate search
+#     exactTime, approximateTime: seconds spent finding the closest PRs by both paths
+##############################################################################
+def compare(recommender, records):
+    report = {"exact": [0, 0, 0], "approximate": [0, 0, 0], "found": 0, "total": 0,
+              "candidates": 0, "testcases": 0, "exactTime": 0.0, "approximateTime": 0.0}
+    for dedic, testScore, testModel in recommender.testcases(records):
+        start = time.perf_counter()
+        exact = recommender.similarPRs(testScore, testModel, exact=True)
+        report["exactTime"] += time.perf_counter() - start
+        start = time.perf_counter()
+        approximate = recommender.similarPRs(testScore, testModel)
+        report["approximateTime"] += time.perf_counter() - start
+
+        found = set(i for sc, i in approximate)
+        report["found"] += sum(1 for sc, i in exact if i in found)
+        report["total"] += len(exact)
+        if testModel > recommender.minRel:
+            report["candidates"] += len(recommender.annIndex.candidates(testScore))
+        report["testcases"] += 1
+        recommender.countPrediction(dedic, recommender.rankAuthors(exact, dedic[0]), report["exact"])
+        recommender.countPrediction(dedic, recommender.rankAuthors(approximate, dedic[0]), report["approximate"])
+
+    report["recall"] = float(report["found"])/report["total"] if report["total"] else 1.0
+    report["candidates"] = float(report["candidates"])/report["testcases"] if report["testcases"] else 0.0
+    return report
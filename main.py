@@ -1,356 +1,197 @@
-from author import Author, AuthorList
-import expertise
-import vectorSpace
+from recommender import Recommender, raiseFieldSizeLimit
+import evaluate
+import sweep
+import lsh
+import server
+import registry
+import metrics
+import textClean
+import ingest
+import argparse
+import asyncio
 import os
-import csv, sys
-import time
-
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from stop_words import get_stop_words
-from nltk.stem.lancaster import LancasterStemmer
-
-# generate stopwords set as preparation of cleaning PR contents
-stop_nltk = set(stopwords.words("english"))
-stop_Add = set(["et", "al", "etc", "add", "delete", "note", "thank", "another", "please", "per", "test", "implement", "complete", "hello", "fix", "say", "said", "would", "one", "back", "could", "thought", "think", "see", "seem", "want", "like", "still", "go", "went", "around", "make", "made", "come", "came", "hi", "much", "wa", "well", "though", "only", "onli", "might", "away", "even", "know", "many", "good", "get", "got", "right", "must", "great", "us", "something", "yet", "app", "use", "really", "day", "put", "set", "ok"])
-stop_sw = set(get_stop_words('en'))
-stopW = stop_nltk.union(stop_Add).union(stop_sw)
-
-# Stemming tools. Used for cleaning PR contents
-p_stemmer = LancasterStemmer()
-
-###############################################################################
-# list of all authors in the training dataset of a project. 
-# Reset before training each project
-# class AuthorList is defined in author.py
-###############################################################################
-authors = AuthorList()
+import sys
 
 ###############################################################################
-# List of scores of all PRs in vector space. Only training dataset included
+# Recommender of the project being processed by the functions below.
 # Reset before training each project
-# vectorScore[i] is a vector score, performing as a list, of the i-th PR
+# class Recommender is defined in recommender.py and owns the trained model.
+# Use it directly to work on several projects at a time
 ###############################################################################
-vectorScore = []
+recommender = Recommender()
 
-###############################################################################
-# List of models of vector scores of all PRs in vector space. 
-# Only training dataset included
-# Reset before training each project
-# vectorModel[i] is a value being the model value of vectorScore[i]
-###############################################################################
-vectorModel = []
+# Train models from training dataset
+def Train(file):
+    return recommender.train(file)
 
-###############################################################################
-# Chart of relation scores in common networks. Only training dataset included
-# Reset before training each project
-# relationScore[i][j] is a relation score from author i to author j
-# relationScore is not a symmetery chart. 
-# (i.e. relationScore[i][j] == relationScore[j][i] is UNNECESSARY)
-###############################################################################
-relationScore = []
+# Save the trained model of the project into a file. source is the hash of the training dataset
+def Save(path, source):
+    return recommender.save(path, source)
 
-###############################################################################
-# List of all words in the training dataset of a project as the base of vector space.
-# Reset before training each project
-# Stopwords are not included
-###############################################################################
-vectorBase = []
+# Load the trained model of a project from a file saved by Save()
+# Return False if the file is missing or was built from another training dataset
+def Load(path, source):
+    return recommender.load(path, source)
 
-###############################################################################
-# List of counts of appearance of every word in vectorSpace in the project
-# Reset before training each project
-# vectorBaseCnt[i] refers to number of times the i-th word in vectorSpace has appeared in the project
-###############################################################################
-vectorBaseCnt = []
+# Load the model of a training dataset from the model folder.
+# If there is no model built from the same file yet, train it and save it into the folder
+def LoadOrTrain(file, modelDir, retrain = False):
+    return recommender.loadOrTrain(file, modelDir, retrain)
 
-###############################################################################
-# List of all PRs in the training dataset of a project. 
-# Reset before training each project
-# data is loaded from .csv input files
-# PR[i] refers to the i-th PR in the training dataset
-# for each PR, there are several attributes:
-# [0]: "PR" sign  [1]: title  [2]: content  [4]: user_list  [5]: start_time  [6]: end_time
-###############################################################################
-PRs = []
+# accuracy data over all projects tested so far
+predictCnt = 0
+correctCnt = 0
+actualCnt = 0
 
-baseline = 0.0
-deadline = 0.0
+# Add counters of a project into the accuracy data, and print Precision & Recall so far
+def Report(counts):
+    global predictCnt, correctCnt, actualCnt
+    predictCnt += counts[0]
+    correctCnt += counts[1]
+    actualCnt += counts[2]
+    print ("Precision:", float(correctCnt)/predictCnt, "Recall:", float(correctCnt)/actualCnt)
 
-# function to judge if a statement (content/title/author name) only contains general ASCII characters
-def judgeLegal(word):
-    return (len(word)>0) and (all (ord(c)<128 for c in word))
+# Running test dataset
+# In batch mode, similarities of all testcases are computed by sparse matrix products (see batchScore.py)
+def Test(file, batch = False):
+    Report(recommender.test(file, batch))
 
-# function to judge if a statement (content/title/author name) only contains English letters
-def judgeEnglish(word):
-    return word.isalpha() and judgeLegal(word)
+# comma separated values of a hyperparameter grid, e.g. "3,5"
+def intList(value):
+    return [int(each) for each in value.split(",")]
 
-def getTopK(K, lis):
-    if (K == 0):
-        return
-    if (lis[K][0] > lis[K-1][0]):
-        tmp = lis[K]
-        lis[K] = lis[K-1]
-        lis[K-1] = tmp
-        getTopK(K-1, lis)
-    return
+def floatList(value):
+    return [float(each) for each in value.split(",")]
 
-# Train models from training dataset
-def Train(file):
-    global PRs, vectorBase, vectorBaseCnt, relationScore, vectorScore, authors, baseline, deadline, vectorModel
-    
-    # Reset of global variables
-    baseline = time.time()
-    deadline = 0.0
-    csv_file = csv.reader(open(file,'r',errors='ignore'))
-    PRs = []
-    vectorBase = []
-    vectorBaseCnt = []
-    vectorScore = []
-    vectorModel = []
-    authors.clear()
-    
-    # Read each line (PR) from training dataset
-    # PR attributes: [0]: PR  [1]: title  [2]: content  [4]: user_list  [5]: start_time  [6]: end_time
-    for e, PR in enumerate(csv_file):
-        # if the line is not PR, skip
-        if (PR[0] != "PR"):
-            continue
-        
-        # Get title & content of the PR. And merge them.
-        contentTitle = word_tokenize(PR[1])
-        contentDetail = word_tokenize(PR[2])
-        contentTitle.extend(contentDetail)
-        content = contentTitle
-        
-        # Remove stopwords and generate vector space
-        cleanContent = []
-        # iterate each word
-        for i in range(len(content)):
-            word = content[i]
-            lword = word.lower()
-            stword = p_stemmer.stem(lword)
-            # if the word is a legal English word and not a stopword, add into the actual content list
-            if (judgeEnglish(word) and len(word)>1 and (word not in stopW) and (lword not in stopW) and (stword not in stopW)):
-                cleanContent.append(stword)
-                # if it is a new word founded, add a new dimension to the vector space
-                if (stword not in vectorBase):
-                    vectorBase.append(stword)
-                    vectorBaseCnt.append(1)
-                # else, add the appearance count of the word
-                elif (content.index(word) == i):
-                    ind = vectorBase.index(stword)
-                    vectorBaseCnt[ind] += 1
-        
-        # Get the merged contents after stopwords removed
-        PR[1] = cleanContent
-        
-        # If the PR has words & all characters are legal
-        if (len(cleanContent)>0) and judgeLegal(PR[4]):
-            
-            # Get the time of PR and process it into consistent format
-            PR[5] = time.mktime(time.strptime(PR[5], "%Y-%m-%d %X"))
-            PR[6] = time.mktime(time.strptime(PR[6], "%Y-%m-%d %X"))
-            if (PR[5] < baseline):
-                baseline = PR[5]
-            if (PR[6] > deadline):
-                deadline = PR[6]
-            
-            # Get authors involved in this PR. Add them into the author list of the project
-            eList = PR[4].split(",")
-            for eachAuthor in eList:
-                newAuthor = Author(eachAuthor)
-                authors.add(newAuthor)
-                
-            # Append processed PR into the PR lists
-            PRs.append(PR)
-    
-    # Part A Score. Calculate tfidf for each PR and get its score in the vector space
-    vectorScore = vectorSpace.tfidf(PRs, vectorBase, vectorBaseCnt, len(PRs))
-    for each in vectorScore:
-        vectorModel.append(expertise.model(each))
-    
-    # Part C Score. Calculate common network scores among authors.
-    baseline -= 24 * 3600
-    relationScore = authors.makeRelations(PRs, baseline, deadline)
 
-    # Check relations by getting cosine similarities of vector scores among PRs. Used for debugging
-#    for i in range(len(PRs)-1):
- #       for j in range(i+1, len(PRs)):
-  #          if expertise.cos(vectorScore[i], vectorScore[j])>0:
-   #             print (expertise.cos(vectorScore[i], vectorScore[j]), PRs[i][4], PRs[j][4])
+if __name__ == "__main__":
     
-    return 0
-
-predictCnt = 0
-correctCnt = 0
-actualCnt = 0
-
-# Running test dataset
-def Test(file):
-    global PRs, vectorBase, vectorBaseCnt, relationScore, vectorScore, authors, baseline, deadline, vectorModel
-    global predictCnt, correctCnt, actualCnt
+    parser = argparse.ArgumentParser(description="Recommend reviewers for the PRs of every project in ./archive/")
+    parser.add_argument("--batch", action="store_true", help="score each test dataset at once with sparse matrix products (needs numpy & scipy)")
+    parser.add_argument("--model-dir", default="./models/", help="folder of saved models. A project is only retrained when its training dataset changes")
+    parser.add_argument("--retrain", action="store_true", help="retrain every project even if a saved model is up to date")
+    parser.add_argument("--processes", type=int, default=None, help="number of projects processed in parallel (default: number of CPUs)")
+    parser.add_argument("--split", type=int, default=0, help="split the test dataset of each project into this many chunks scored in parallel. Projects are then processed one by one")
+    parser.add_argument("--train", metavar="FILE", help="only train from this dataset (\"-\" for stdin) instead of ./archive/")
+    parser.add_argument("--test", metavar="FILE", help="with --train, the test dataset (\"-\" for stdin)")
+    parser.add_argument("--sweep", action="store_true", help="test every combination of --K, --r, --relation-const & --lam in one pass, and print a table of the accuracy over all projects")
+    parser.add_argument("--K", type=intList, default=[5], help="with --sweep, numbers of recommended authors, e.g. 3,5")
+    parser.add_argument("--r", type=intList, default=[10], help="with --sweep, numbers of closest PRs, e.g. 5,10")
+    parser.add_argument("--relation-const", type=floatList, default=[1.0], help="with --sweep, values of relationConst")
+    parser.add_argument("--lam", type=floatList, default=[0.8], help="with --sweep, values of lam")
+    parser.add_argument("--ann", type=intList, metavar="BITS,TABLES,PROBES", default=None, help="find the closest PRs by approximate LSH search (needs numpy), e.g. 8,32,1: about 95%% recall of the exact closest PRs on ./archive/, but no faster than exact search at its size. Fewer bits, more tables or probes: better recall, slower. Cannot be used with --batch")
+    parser.add_argument("--ann-report", action="store_true", help="compare approximate search, with the parameters of --ann or 8,32,1, & exact search on every project: recall of the exact closest PRs, and Precision & Recall of both")
+    parser.add_argument("--serve", action="store_true", help="serve reviewer recommendations of every project as JSON lines on a local socket (see server.py)")
+    parser.add_argument("--host", default="127.0.0.1", help="with --serve, host to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="with --serve, TCP port to listen on")
+    parser.add_argument("--socket", metavar="PATH", default=None, help="with --serve, listen on this unix socket instead of a TCP port")
+    parser.add_argument("--metrics", metavar="FILE", default=None, help="collect timers & counters of every stage and write them into FILE, in Prometheus text format if FILE ends with .prom, as JSON otherwise")
+    parser.add_argument("--profile", metavar="DIR", default=None, help="with --metrics, write cProfile stats of each project into DIR")
+    parser.add_argument("--tracemalloc", action="store_true", help="with --profile, also write the top memory allocations of each project")
+    parser.add_argument("--tokenizer", choices=["nltk", "fast"], default="nltk", help="word_tokenize of NLTK, or a faster regular expression approximating it (see textClean.py)")
+    parser.add_argument("--tokenizer-report", action="store_true", help="compare the fast tokenizer with word_tokenize on the datasets of every project")
+    parser.add_argument("--memory-budget", type=float, metavar="MB", default=None, help="with --serve, memory of the models kept loaded. Least recently used projects are evicted & reloaded when needed")
+    parser.add_argument("--memory-report", action="store_true", help="load the model of every project side by side and print the memory of each")
+    parser.add_argument("--rolling", action="store_true", help="replay all PRs of every project in time order: each PR is tested with the PRs finished before it, then added into the model")
+    parser.add_argument("--window", type=float, metavar="DAYS", default=None, help="with --rolling, only keep the PRs finished in the last DAYS days in the model")
+    parser.add_argument("--warmup", type=int, default=0, help="with --rolling, number of first PRs of every project added without being tested")
+    args = parser.parse_args()
+    if args.profile and args.split > 0:
+        parser.error("--profile cannot be used with --split")
+    if args.ann and args.batch:
+        parser.error("--ann cannot be used with --batch, which is always exact")
     
-    # Maximum tolerance of differece as equalization. i.e. when abs(a-b)<minRel, we regard a=b
-    minRel = 1e-10
+    # functions of this module are found as main.Train & main.Test by metrics.py
+    sys.modules.setdefault("main", sys.modules[__name__])
+    raiseFieldSizeLimit()
+    textClean.setTokenizer(args.tokenizer)
     
-    # Read test dataset
-    csv_file = csv.reader(open(file,'r',errors='ignore'))
+    # a single project given by its datasets, read as streams
+    if args.train:
+        if args.metrics:
+            metrics.enable()
+        Train(args.train)
+        if args.ann:
+            recommender.useANN(*args.ann)
+        if args.test:
+            Test(args.test, args.batch)
+        if args.metrics:
+            metrics.write(args.metrics)
+        sys.exit(0)
     
-    # Set top-K-user estimation to top-5
-    K = 5
+    # Get all project folders in the list
+    reviews = evaluate.listProjects("./archive/")
     
-    # Set top-r-closest PRs to top-10-closest PR
-    r = 10
+    # replay projects in time order
+    if args.rolling:
+        window = None if args.window is None else args.window * 24 * 3600
+        reports = evaluate.rollingProjects(reviews, window, args.warmup, args.processes)
+        for each, report in zip(reviews, reports):
+            print (each, "tested:", report["tested"], "timeline seconds:", report["timelineSeconds"], "replay seconds:", report["seconds"], "total seconds:", report["totalSeconds"])
+            Report(report["counts"])
+        sys.exit(0)
     
-    # For each line in test dataset
-    for e, testcase in enumerate(csv_file):
-        # if the testcase is not a PR, skip
-        if (testcase[0] != "PR"):
-            continue
-        
-        # if (e > 100):
-        #   break
-        # Get title & content of the testcase. And merge them.
-        contentTitle = word_tokenize(testcase[1])
-        contentDetail = word_tokenize(testcase[2])
-        contentTitle.extend(contentDetail)
-        content = contentTitle
-        
-        # Remove stopwords
-        cleanContent = []
-        # iterate each word
-        for i in range(len(content)):
-            word = content[i]
-            lword = word.lower()
-            stword = p_stemmer.stem(lword)
-            # if the word is a legal English word and not a stopword, add into the actual content list
-            if (judgeEnglish(word) and len(word)>1 and (word not in stopW) and (lword not in stopW) and (stword not in stopW)):
-                cleanContent.append(stword)
-                
-        # Get the merged contents after stopwords removed
-        testcase[1] = cleanContent
-        
-        # If the PR has words & all characters are legal
-        if (len(cleanContent)>0) and judgeLegal(testcase[4]):
-            
-            # Get vector score of the testcase in the vector space generated from the training dataset
-            testScore = vectorSpace.tfidf([testcase], vectorBase, vectorBaseCnt, len(PRs))[0]
-            
-            # Find k closest PRs based on cosine similarities of vector scores, then calculate Expertise Scores for related authors; k = 5
-            totalScore = [0.0]*authors.length()
-            
-            # Model of vector score of the testcase
-            testModel = expertise.model(testScore)
-            
-            if (testModel > minRel):
-                topR = [[0,-1] for e in range(r+1)]
-                # cosine similarities with each PR in training dataset
-                for i in range(len(PRs)):
-                    score = expertise.cos(vectorScore[i], testScore, vectorModel[i], testModel)
-                    if (score < minRel):
-                        continue
-                    if (score > topR[r][0]):
-                        topR[r] = [score,i]
-                        getTopK(r, topR)
-                
-                # Get k largest ones.
-                topR = topR[:r]
-         
-                # For each PR in k largest similarity PRs. sc being the similarity score, ind being the index of PR in training dataset
-                for sc, ind in topR:
-                
-                    # if the score is equal to 0, there is no relation, which happens when only fewer than k PRs in training dataset are related to the testcase PR
-                    if sc == 0 or ind == -1:
-                        continue    
-                
-                    # Get authors related to the training PR and add Expertise Scores for them
-                    usrList = PRs[ind][4].split(",")
-                    for eachUsr in usrList:
-                        usrid = authors.find(eachUsr)[0]
-                        totalScore[usrid] += sc
-        
-            # Add common network score, and check the result
-            # dedic is the list of all authors related in this testcase PR
-            dedic = testcase[4].split(",")
-            
-            # the one who submit the testcase PR
-            contributor = dedic[0]
-            
-            # get his id in the author list generated from training data. 
-            # If the contributor doesn't exist in the author list, existance will get a value of False, otherwise True
-            [con_id, existance] = authors.find(contributor)
-            
-            topKusr = [[0,-1] for e in range(K+1)]
-            # Add common network scores for each author related to the contributor
-            for i in range(authors.length()):
-                # if the contributor exists in the author list from training dataset
-                if existance:
-                    totalScore[i] += relationScore[con_id][i]
-                if (totalScore[i] > topKusr[K][0]):
-                    topKusr[K] = [totalScore[i], i]
-                    getTopK(K, topKusr)
-                
-            # Get k largest ones.
-            topKusr = topKusr[:K]
-            
-            # K closest authors to the testcase PR are predicted. Add K into the predict counter. For Precision
-            predictCnt += len(topKusr)
-            # The list of k closest authors to the PR
-            predictList = []
-            # sc being the total score of the author, ind being its index in author list
-            for sc, ind in topKusr:
-                if (ind == -1):
-                    predictCnt -= 1
-                    continue
-                name = authors.getName(ind)
-                predictList.append(name)
-                # if the author predicted is in the testcase result, it is correctly predicted
-                if name in dedic:
-                    correctCnt += 1
-                
-            # Add all authors related to this testcase PR into counters for Recall
-            actualCnt += len(set(dedic))
-            # Print the predict list and actual list of authors related to the testcase PR
-            # print(predictList, set(dedic), authors.find(contributor)[1])
-            # print (correctCnt, predictCnt, actualCnt)
-            # print(" ")
+    # memory of the models of all projects
+    if args.memory_report:
+        models = registry.ModelRegistry(server.projectsOf(reviews), args.model_dir)
+        for name in models.getProjects():
+            models.get(name)
+        report = models.memoryReport()
+        for name, size in report.items():
+            print ("%s\t%.2f MB" % (name, float(size) / (1 << 20)))
+        print ("total\t%.2f MB" % (float(sum(report.values())) / (1 << 20)))
+        sys.exit(0)
     
-    # Final Precision & Recall of the project
-    print ("Precision:", float(correctCnt)/predictCnt, "Recall:", float(correctCnt)/actualCnt)
-            
-
-
-if __name__ == "__main__":
+    # compare tokenizers
+    if args.tokenizer_report:
+        print ("project\tdataset\tPRs\tsamePRs\tkeptNltk\tkeptFast\tagreement\tnltkSeconds\tfastSeconds\tonlyNltk\tonlyFast")
+        for each in reviews:
+            for dataset in ["training_data.csv", "testing_data.csv"]:
+                report = textClean.compareTokenizers(ingest.readPRs(os.path.join(each, dataset)))
+                print ("\t".join([each, dataset] + [str(report[key]) for key in ["PRs", "samePRs", "keptNltk", "keptFast", "agreement", "nltkSeconds", "fastSeconds", "onlyNltk", "onlyFast"]]))
+        sys.exit(0)
     
-    # Adjust maxsize to successfully load large .csv files
-    maxInt = sys.maxsize
-    decrement = True
-    while decrement:
-        # decrease the maxInt value by factor 2
-        # as long as the OverflowError occurs.
-        decrement = False
+    # serve recommendations until interrupted
+    if args.serve:
         try:
-            csv.field_size_limit(maxInt)
-        except OverflowError:
-            maxInt = int(maxInt/2)
-            decrement = True
+            budget = None if args.memory_budget is None else int(args.memory_budget * (1 << 20))
+            asyncio.run(server.ReviewerServer(server.projectsOf(reviews), args.model_dir, budget=budget).serve(args.host, args.port, args.socket))
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
     
-    # Get all project folders in the list
-    reviews = []
-    file_dir = "./archive/"
-    for root, dirs, files in os.walk(file_dir):
-        for d in dirs:
-            reviews.append(os.path.join(root, d))
-            
-    # reset accuracy data
-    predictCnt = 0
-    correctCnt = 0
-    actualCnt = 0
+    # compare approximate search to exact search
+    if args.ann_report:
+        reports = evaluate.compareANNProjects(reviews, args.ann or lsh.defaultParams, args.processes, args.model_dir, args.retrain)
+        print ("project\trecall\tcandidates\texactTime\tapproximateTime\texactPrecision\texactRecall\tapproximatePrecision\tapproximateRecall")
+        for each, report in zip(reviews, reports):
+            exact = report["exact"]
+            approximate = report["approximate"]
+            print ("\t".join(str(value) for value in [each, report["recall"], report["candidates"], report["exactTime"], report["approximateTime"],
+                   float(exact[1])/exact[0], float(exact[1])/exact[2], float(approximate[1])/approximate[0], float(approximate[1])/approximate[2]]))
+        sys.exit(0)
+    
+    # test every configuration of the grids
+    if args.sweep:
+        results = evaluate.sweepProjects(reviews, args.K, args.r, args.relation_const, args.lam, args.processes, args.model_dir, args.retrain)
+        for line in sweep.formatTable(sweep.mergeResults(results)):
+            print (line)
+        sys.exit(0)
     
     # process each project
-    for each in reviews:
+    if args.split > 0:
+        snapshots = [] if args.metrics else None
+        results = [evaluate.evaluateProjectSplit(each, args.processes, args.split, args.model_dir, args.retrain, args.batch, args.ann, snapshots) for each in reviews]
+        if args.metrics:
+            metrics.reset()
+            for snapshot in snapshots:
+                metrics.merge(snapshot)
+    elif args.metrics:
+        results = evaluate.evaluateProjectsMetered(reviews, args.processes, args.model_dir, args.retrain, args.batch, args.ann, args.profile, args.tracemalloc)
+    else:
+        results = evaluate.evaluateProjects(reviews, args.processes, args.model_dir, args.retrain, args.batch, args.ann)
+    for each, counts in zip(reviews, results):
         print (each)
-        Train(each+"/training_data.csv")
-        Test(each+"/testing_data.csv")
-        # break
\ No newline at end of file
+        Report(counts)
+    if args.metrics:
+        metrics.write(args.metrics)
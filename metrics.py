@@ -0,0 +1,231 @@
+import cProfile
+import functools
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+###############################################################################
+# Instrumentation of the recommender
+#
+# Disabled by default. enable() wraps the stages listed in `stages` with
+# timers, and hot paths update counters only behind `if metrics.enabled:`, so
+# a disabled run pays nothing but that test once per query. disable() puts the
+# original functions back.
+#
+# timers[name]: [number of calls, total seconds] of a stage
+# counters[name]: sum of a counter, e.g. tokens processed or candidates scored
+# samples[name]: every value observed, e.g. the latency of each query, to get
+#                percentiles
+#
+# Metrics of worker processes are returned by snapshot() and added into the
+# metrics of the main process by merge().
+###############################################################################
+
+enabled = False
+
+timers = {}
+counters = {}
+samples = {}
+
+# percentiles reported for samples
+quantiles = [0.5, 0.95, 0.99]
+
+# stages wrapped with timers by enable(): [module name, class name or None, function name, stage name]
+stages = [
+    ["main", None, "Train", "main.Train"],
+    ["main", None, "Test", "main.Test"],
+    ["recommender", "Recommender", "train", "Recommender.train"],
+    ["recommender", "Recommender", "reweight", "Recommender.reweight"],
+    ["recommender", "Recommender", "test", "Recommender.test"],
+    ["recommender", "Recommender", "similarPRs", "Recommender.similarPRs"],
+    ["recommender", "Recommender", "rankAuthors", "Recommender.rankAuthors"],
+    ["vectorSpace", None, "tfidf", "vectorSpace.tfidf"],
+    ["vectorSpace", None, "tfidfTerms", "vectorSpace.tfidfTerms"],
+    ["expertise", None, "cos", "expertise.cos"],
+    ["author", "AuthorList", "makeRelations", "AuthorList.makeRelations"],
+]
+
+# original functions of the wrapped stages, to be restored by disable()
+originals = []
+
+def reset():
+    timers.clear()
+    counters.clear()
+    samples.clear()
+
+# add value to a counter
+def count(name, value = 1):
+    counters[name] = counters.get(name, 0) + value
+
+# add one sample, e.g. the latency of a query in seconds
+def observe(name, value):
+    samples.setdefault(name, []).append(value)
+
+# add the duration of one call of a stage
+def addTime(name, seconds):
+    timer = timers.get(name)
+    if timer is None:
+        timer = timers[name] = [0, 0.0]
+    timer[0] += 1
+    timer[1] += seconds
+
+# time a block of code as a stage
+@contextmanager
+def timer(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        addTime(name, time.perf_counter() - start)
+
+# wrap a function with a timer
+def timed(function, name):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            addTime(name, time.perf_counter() - start)
+    return wrapper
+
+# start collecting metrics. Stages of modules not imported yet are imported to be wrapped
+def enable():
+    global enabled
+    if enabled:
+        return 0
+    import importlib
+    for moduleName, className, functionName, name in stages:
+        owner = importlib.import_module(moduleName)
+        if className is not None:
+            owner = getattr(owner, className)
+        function = owner.__dict__[functionName]
+        originals.append([owner, functionName, function])
+        setattr(owner, functionName, timed(function, name))
+    enabled = True
+    return 0
+
+# stop collecting metrics. Metrics collected so far are kept until reset()
+def disable():
+    global enabled
+    while originals:
+        owner, functionName, function = originals.pop()
+        setattr(owner, functionName, function)
+    enabled = False
+    return 0
+
+# value of the q-th quantile of sorted values, by the nearest rank
+def quantile(values, q):
+    if not values:
+        return 0.0
+    rank = min(len(values) - 1, max(0, int(q * len(values) + 0.5) - 1))
+    return values[rank]
+
+# summary of the samples of a name: count, sum & percentiles
+def summary(name):
+    values = sorted(samples.get(name, []))
+    result = {"count": len(values), "sum": sum(values)}
+    for q in quantiles:
+        result["p%d" % int(q * 100)] = quantile(values, q)
+    return result
+
+# metrics collected so far, as plain lists & dicts that can be sent to another process
+def snapshot():
+    return {"timers": {name: list(value) for name, value in timers.items()},
+            "counters": dict(counters),
+            "samples": {name: list(value) for name, value in samples.items()}}
+
+# add a snapshot of another process into the metrics of this one
+def merge(other):
+    for name, [calls, seconds] in other["timers"].items():
+        timer = timers.setdefault(name, [0, 0.0])
+        timer[0] += calls
+        timer[1] += seconds
+    for name, value in other["counters"].items():
+        count(name, value)
+    for name, values in other["samples"].items():
+        samples.setdefault(name, []).extend(values)
+    return 0
+
+# the stem cache is reported as it is now (see textClean.cacheStats())
+def cacheCounters():
+    import textClean
+    stats = textClean.cacheStats()
+    return {"stemCacheHits": stats["hits"], "stemCacheMisses": stats["misses"]}
+
+# all metrics as a dict, to be written as JSON
+def export():
+    result = {"timers": {name: {"calls": calls, "seconds": seconds} for name, [calls, seconds] in sorted(timers.items())},
+              "counters": dict(sorted(counters.items())),
+              "histograms": {name: summary(name) for name in sorted(samples)}}
+    for name, value in cacheCounters().items():
+        result["counters"].setdefault(name, value)
+    return result
+
+def exportJSON():
+    return json.dumps(export(), indent=1)
+
+# name of a metric in Prometheus format
+def promName(name):
+    return "reviewer_" + "".join(c if c.isalnum() else "_" for c in name)
+
+# all metrics in Prometheus text exposition format
+def exportPrometheus():
+    data = export()
+    lines = []
+    lines.append("# TYPE reviewer_stage_seconds_total counter")
+    for name, each in data["timers"].items():
+        lines.append('reviewer_stage_seconds_total{stage="%s"} %r' % (name, each["seconds"]))
+    lines.append("# TYPE reviewer_stage_calls_total counter")
+    for name, each in data["timers"].items():
+        lines.append('reviewer_stage_calls_total{stage="%s"} %d' % (name, each["calls"]))
+    for name, value in data["counters"].items():
+        lines.append("# TYPE %s_total counter" % promName(name))
+        lines.append("%s_total %r" % (promName(name), value))
+    for name, each in data["histograms"].items():
+        lines.append("# TYPE %s summary" % promName(name))
+        for q in quantiles:
+            lines.append('%s{quantile="%r"} %r' % (promName(name), q, each["p%d" % int(q * 100)]))
+        lines.append("%s_sum %r" % (promName(name), each["sum"]))
+        lines.append("%s_count %d" % (promName(name), each["count"]))
+    return "\n".join(lines) + "\n"
+
+# write all metrics into a file, in Prometheus format if its name ends with .prom, as JSON otherwise
+def write(path):
+    with open(path, "w") as f:
+        f.write(exportPrometheus() if path.endswith(".prom") else exportJSON())
+    return path
+
+##############################################################################
+# Profile a block of code, e.g. the evaluation of one project
+#
+# Input:
+#   name: name of the output files
+#   folder: folder of the output files
+#   profile: write cProfile stats into <folder>/<name>.prof
+#   memory: write the top allocations of tracemalloc into <folder>/<name>.mem.txt
+##############################################################################
+@contextmanager
+def profiled(name, folder, profile = True, memory = False, top = 30):
+    os.makedirs(folder, exist_ok=True)
+    profiler = cProfile.Profile() if profile else None
+    if memory:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(os.path.join(folder, name + ".prof"))
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(os.path.join(folder, name + ".mem.txt"), "w") as f:
+                f.write("current %d peak %d\n" % (current, peak))
+                for stat in snapshot.statistics("lineno")[:top]:
+                    f.write(str(stat) + "\n")
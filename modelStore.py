@@ -0,0 +1,210 @@
+import hashlib
+import json
+import mmap
+import os
+import sys
+from array import array
+
+import textClean
+
+###############################################################################
+# Persistence of trained project models
+#
+# A model is saved into a single binary file:
+#   magic (8 bytes) | header length (8 bytes) | JSON header | arrays & strings
+# Every array starts on an 8-byte boundary, so a loaded file is memory-mapped
+# and arrays are used in place as memoryviews, without parsing or copying.
+# Lists of strings (words, author names) are stored as one
+# UTF-8 block separated by newlines.
+#
+# A model is keyed by a hash of the training .csv file, of formatVersion and
+# of the tokenizer (see textClean.py) if it is not word_tokenize.
+# load() returns None when the model is missing or was built from other data,
+# in which case the project is retrained and saved again.
+###############################################################################
+
+magic = b"RVRMODEL"
+
+# bump when the way models are built or saved changes
+formatVersion = 5
+
+# hash of a training dataset file, used as the key of its model
+def fileHash(file):
+    h = hashlib.sha1(("v%d:" % formatVersion).encode())
+    if textClean.getTokenizer() != "nltk":
+        h.update(("%s:" % textClean.getTokenizer()).encode())
+    with open(file, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+# path of the model of a training dataset file in the model folder
+def modelPath(modelDir, file):
+    project = os.path.basename(os.path.dirname(os.path.abspath(file)))
+    name = os.path.splitext(os.path.basename(file))[0]
+    return os.path.join(modelDir, project + "-" + name + ".model")
+
+# path of a model changed since it was built from a training dataset, e.g. by Recommender.addPR().
+# It is kept apart from the model of the dataset, which loadOrTrain() would take it for
+def changedPath(modelDir, file):
+    return modelPath(modelDir, file)[:-len(".model")] + "-changed.model"
+
+# key of a changed model: the hash of its training dataset, of the words & authors it knows and of the PRs it holds
+def changedHash(source, PRs, words, authors):
+    h = hashlib.sha1(source.encode())
+    h.update("\n".join(words).encode("utf-8"))
+    h.update(b"\0")
+    h.update("\n".join(authors).encode("utf-8"))
+    for name, column in sorted(PRs.getArrays().items()):
+        h.update(name.encode())
+        h.update(bytes(column))
+    return h.hexdigest()
+
+###############################################################################
+# Rows of a sparse matrix stored as CSR arrays
+#
+# rows[i] is a dict mapping column to value, built when the row is accessed.
+# Used for vector scores (see expertise.py) and relation scores loaded from a model file
+###############################################################################
+class SparseRows(object):
+
+    def __init__(self, offsets, cols, values):
+        self.__offsets = offsets
+        self.__cols = cols
+        self.__values = values
+
+    def __len__(self):
+        return len(self.__offsets) - 1
+
+    def __getitem__(self, i):
+        head = self.__offsets[i]
+        tail = self.__offsets[i+1]
+        return dict(zip(self.__cols[head:tail], self.__values[head:tail]))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+# flatten sparse vector scores into CSR arrays
+def sparseArrays(vectors):
+    offsets = array('q', [0])
+    cols = array('q')
+    values = array('d')
+    for vector in vectors:
+        cols.extend(vector.keys())
+        values.extend(vector.values())
+        offsets.append(len(cols))
+    return offsets, cols, values
+
+
+##############################################################################
+# Save a trained model
+#
+# Input:
+#   path: file to write
+#   source: hash of the training dataset, see fileHash()
+#   model: dict of the trained state of a Recommender (see Recommender.save()), with keys
+#          vectorBase, PRs, vectorScore, vectorModel, prIndex, authors,
+#          relationScore, baseline, deadline
+##############################################################################
+def save(path, source, model):
+    vectorBase = model["vectorBase"]
+    PRs = model["PRs"]
+    authors = model["authors"]
+    
+    arrays = {}
+    arrays["wordCounts"] = vectorBase.getCounts()
+    arrays["vectorOffsets"], arrays["vectorCols"], arrays["vectorValues"] = sparseArrays(model["vectorScore"])
+    arrays["vectorModel"] = model["vectorModel"]
+    arrays["postingTerms"], arrays["postingMin"], arrays["postingMax"], arrays["postingOffsets"], arrays["postingIds"], arrays["postingWeights"] = model["prIndex"].getArrays()
+    arrays["relationOffsets"], arrays["relationCols"], arrays["relationValues"] = sparseArrays(dict(sorted(row.items())) for row in model["relationScore"])
+    for name, column in PRs.getArrays().items():
+        arrays["PR." + name] = column
+    
+    strings = {}
+    strings["words"] = vectorBase.getWords()
+    strings["authors"] = [authors.getName(i) for i in range(authors.length())]
+    
+    header = {"version": formatVersion, "source": source, "byteorder": sys.byteorder,
+              "baseline": model["baseline"], "deadline": model["deadline"],
+              "arrays": {}, "strings": {}}
+    
+    # lay out every section on an 8-byte boundary
+    blocks = []
+    offset = 0
+    def addBlock(data):
+        nonlocal offset
+        start = offset
+        blocks.append(data)
+        offset += len(data)
+        pad = -offset % 8
+        if pad:
+            blocks.append(b"\0" * pad)
+            offset += pad
+        return start
+    for name, values in arrays.items():
+        typecode = 'd' if name in ("vectorValues", "vectorModel", "postingMin", "postingMax", "postingWeights", "relationValues", "PR.startTimes", "PR.endTimes") else 'q'
+        if not (isinstance(values, array) and values.typecode == typecode):
+            values = array(typecode, values)
+        header["arrays"][name] = [typecode, addBlock(values.tobytes()), len(values)]
+    for name, values in strings.items():
+        data = "\n".join(values).encode("utf-8")
+        header["strings"][name] = [addBlock(data), len(data), len(values)]
+    
+    head = json.dumps(header).encode("utf-8")
+    head += b" " * (-len(head) % 8)
+    
+    # write to a temporary file first, so a model file is never half written
+    tmp = path + ".tmp"
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(tmp, 'wb') as f:
+        f.write(magic)
+        f.write(len(head).to_bytes(8, "little"))
+        f.write(head)
+        for data in blocks:
+            f.write(data)
+    os.replace(tmp, path)
+    return 0
+
+##############################################################################
+# Load a trained model by memory-mapping its file
+#
+# Input:
+#   path: file to read
+#   source: hash of the training dataset, see fileHash()
+#
+# Output:
+#   dict with keys arrays (memoryviews), strings (lists), baseline & deadline,
+#   or None if the file is missing, broken or built from another dataset
+##############################################################################
+def load(path, source):
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return None
+    with f:
+        try:
+            # copy-on-write, so loaded arrays may be changed in memory without touching the file
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        except ValueError:
+            return None
+    try:
+        if buf[:8] != magic:
+            return None
+        hlen = int.from_bytes(buf[8:16], "little")
+        header = json.loads(buf[16:16+hlen].decode("utf-8"))
+    except ValueError:
+        return None
+    if header.get("version") != formatVersion or header.get("source") != source or header.get("byteorder") != sys.byteorder:
+        return None
+    
+    data = memoryview(buf)[16+hlen:]
+    model = {"baseline": header["baseline"], "deadline": header["deadline"], "arrays": {}, "strings": {}}
+    for name, [typecode, start, length] in header["arrays"].items():
+        size = array(typecode).itemsize
+        model["arrays"][name] = data[start:start+size*length].cast(typecode)
+    for name, [start, nbytes, length] in header["strings"].items():
+        model["strings"][name] = bytes(data[start:start+nbytes]).decode("utf-8").split("\n") if length else []
+    return model
@@ -0,0 +1,17 @@
+import importlib
+
+###############################################################################
+# Optional dependencies
+#
+# NumPy & SciPy are only used by batch scoring (batchScore.py), approximate
+# search (lsh.py) and the selection of top-K from arrays (topk.py). Modules
+# get them from require() when they are used, so importing the recommender
+# stays fast and works without them.
+###############################################################################
+
+# import a module by name, e.g. "scipy.sparse". Raise ImportError naming the feature that needs it if it is missing
+def require(name, feature):
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        raise ImportError("%s requires %s" % (feature, name.split(".")[0]))
@@ -0,0 +1,82 @@
+from array import array
+
+###############################################################################
+# Columnar store of the PRs of a training dataset
+#
+# Every attribute is a column in an array, resolved once when the PR is added:
+#   startTimes[i], endTimes[i]: times of the i-th PR in seconds
+#   terms[termOffsets[i]:termOffsets[i+1]]: indices in vector space of the cleaned
+#       title & content of the i-th PR, in the order of the words
+#   users[userOffsets[i]:userOffsets[i+1]]: author ids of the user list of the
+#       i-th PR, the contributor first
+# Columns may be memoryviews of a model file (see modelStore.py); thaw() turns
+# them into arrays before PRs are added.
+###############################################################################
+class PRStore(object):
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.__startTimes = array('d')
+        self.__endTimes = array('d')
+        self.__termOffsets = array('q', [0])
+        self.__terms = array('q')
+        self.__userOffsets = array('q', [0])
+        self.__users = array('q')
+
+    # return the number of PRs
+    def length(self):
+        return len(self.__startTimes)
+
+    def __len__(self):
+        return len(self.__startTimes)
+
+    # add a PR given the indices of its words, the ids of its users & its times. Return its index
+    def append(self, terms, users, startTime, endTime):
+        self.__terms.extend(terms)
+        self.__termOffsets.append(len(self.__terms))
+        self.__users.extend(users)
+        self.__userOffsets.append(len(self.__users))
+        self.__startTimes.append(startTime)
+        self.__endTimes.append(endTime)
+        return len(self.__startTimes) - 1
+
+    # indices in vector space of the words of the i-th PR
+    def getTerms(self, i):
+        return self.__terms[self.__termOffsets[i]:self.__termOffsets[i+1]]
+
+    # author ids of the user list of the i-th PR
+    def getUsers(self, i):
+        return self.__users[self.__userOffsets[i]:self.__userOffsets[i+1]]
+
+    def getStart(self, i):
+        return self.__startTimes[i]
+
+    def getEnd(self, i):
+        return self.__endTimes[i]
+
+    # all columns, e.g. to be saved by modelStore.py
+    def getArrays(self):
+        return {"startTimes": self.__startTimes, "endTimes": self.__endTimes,
+                "termOffsets": self.__termOffsets, "terms": self.__terms,
+                "userOffsets": self.__userOffsets, "users": self.__users}
+
+    # replace all columns by the ones given by getArrays(). Columns may be memoryviews
+    def load(self, columns):
+        self.__startTimes = columns["startTimes"]
+        self.__endTimes = columns["endTimes"]
+        self.__termOffsets = columns["termOffsets"]
+        self.__terms = columns["terms"]
+        self.__userOffsets = columns["userOffsets"]
+        self.__users = columns["users"]
+
+    # copy columns that are memoryviews into arrays, so that PRs can be added
+    def thaw(self):
+        if not isinstance(self.__startTimes, array):
+            self.__startTimes = array('d', self.__startTimes)
+            self.__endTimes = array('d', self.__endTimes)
+            self.__termOffsets = array('q', self.__termOffsets)
+            self.__terms = array('q', self.__terms)
+            self.__userOffsets = array('q', self.__userOffsets)
+            self.__users = array('q', self.__users)
@@ -0,0 +1,595 @@
+import csv, sys
+import time
+from array import array
+
+from author import AuthorList
+from vocabulary import Vocabulary
+from prStore import PRStore
+from invertedIndex import InvertedIndex
+import lsh
+import expertise
+import vectorSpace
+from textClean import judgeLegal
+import textClean
+import batchScore
+import ingest
+import modelStore
+import metrics
+from topk import TopK
+
+# Adjust maxsize to successfully load large .csv files
+def raiseFieldSizeLimit():
+    maxInt = sys.maxsize
+    decrement = True
+    while decrement:
+        # decrease the maxInt value by factor 2
+        # as long as the OverflowError occurs.
+        decrement = False
+        try:
+            csv.field_size_limit(maxInt)
+        except OverflowError:
+            maxInt = int(maxInt/2)
+            decrement = True
+
+# Get a time of PR in seconds. Strings are processed from the format of .csv files
+def parseTime(value):
+    if isinstance(value, str):
+        return time.mktime(time.strptime(value, "%Y-%m-%d %X"))
+    return float(value)
+
+###############################################################################
+# Reviewer recommender of one project
+#
+# Owns everything trained from the training dataset of the project, so that
+# several projects can be trained, saved, loaded and tested side by side.
+#
+# K: number of authors recommended for a PR
+# r: number of closest PRs in training dataset used to score authors
+# minRel: maximum tolerance of differece as equalization. i.e. when abs(a-b)<minRel, we regard a=b
+###############################################################################
+class Recommender(object):
+
+    def __init__(self, K = 5, r = 10, minRel = 1e-10, reweightRatio = 0.1):
+        self.K = K
+        self.r = r
+        self.minRel = minRel
+        # see addPR(). None to only re-weight when reweight() is called
+        self.reweightRatio = reweightRatio
+        # parameters of approximate search (see useANN()). None for exact search
+        self.annParams = None
+        self.clear()
+
+    # Reset of the trained model
+    def clear(self):
+        ###############################################################################
+        # list of all authors in the training dataset of the project. 
+        # class AuthorList is defined in author.py
+        ###############################################################################
+        self.authors = AuthorList()
+        
+        ###############################################################################
+        # List of scores of all PRs in vector space. Only training dataset included
+        # vectorScore[i] is a vector score, performing as a sparse dict (see expertise.py), of the i-th PR
+        ###############################################################################
+        self.vectorScore = []
+        
+        ###############################################################################
+        # List of models of vector scores of all PRs in vector space. 
+        # Only training dataset included
+        # vectorModel[i] is a value being the model value of vectorScore[i]
+        ###############################################################################
+        self.vectorModel = []
+        
+        ###############################################################################
+        # Inverted index of vectorScore. Only training dataset included
+        # class InvertedIndex is defined in invertedIndex.py. Used to find the PRs closest to a testcase
+        # annIndex replaces it by an approximate index when useANN() is called (see lsh.py)
+        ###############################################################################
+        self.prIndex = InvertedIndex(self.vectorScore, self.vectorModel)
+        self.__buildANN()
+        # sparse matrix of vectorScore for batch scoring, built on first use (see similarPRsBatch())
+        self.__trainMatrix = None
+        
+        ###############################################################################
+        # Chart of relation scores in common networks. Only training dataset included
+        # relationScore[i] is a dict, relationScore[i][j] is a relation score from author i to author j
+        # Pairs of authors without relation are not stored
+        # relationScore is not a symmetery chart. 
+        # (i.e. relationScore[i][j] == relationScore[j][i] is UNNECESSARY)
+        ###############################################################################
+        self.relationScore = self.authors.getRelations()
+        
+        ###############################################################################
+        # Vocabulary of all words in the training dataset of the project as the base of vector space.
+        # Stopwords are not included
+        # class Vocabulary is defined in vocabulary.py. It maps every word to its index
+        # in vector space, and keeps the number of times each word has appeared in the project
+        ###############################################################################
+        self.vectorBase = Vocabulary()
+        
+        ###############################################################################
+        # All PRs in the training dataset of the project. 
+        # data is loaded from .csv input files
+        # class PRStore is defined in prStore.py. It keeps the times, the indices of
+        # cleaned words and the author ids of each PR in columns.
+        # raw title & content are not kept
+        ###############################################################################
+        self.PRs = PRStore()
+        
+        # time of the earliest PR, and the baseline used for common networks (one day earlier)
+        self.firstTime = time.time()
+        self.baseline = self.firstTime - 24 * 3600
+        # time of the latest PR
+        self.deadline = 0.0
+        
+        # number of PRs added by addPR() since the last re-weighting
+        self.pending = 0
+        
+        # whether the model is memory-mapped from a file. See thaw()
+        self.__mapped = False
+        # whether the model has changed since it was loaded or saved
+        self.modified = False
+
+    # Train models from training dataset
+    # file is a path, "-" for stdin or an open file. It is read as a stream (see ingest.py)
+    def train(self, file):
+        # Read each PR from training dataset
+        return self.trainRecords(ingest.records(file))
+
+    # Train models from PRs already cleaned into compact records (see ingest.py)
+    def trainRecords(self, records):
+        # Reset of the model
+        self.clear()
+        self.firstTime = time.time()
+        self.deadline = 0.0
+        
+        for record in records:
+            self.__ingest(record)
+        
+        self.reweight()
+        return 0
+
+    ##############################################################################
+    # Add a cleaned PR into vector space, the author list and the PR list
+    #
+    # Input:
+    #   record: compact record of the PR from ingest.py: [pairs, user_list, start_time, end_time]
+    #
+    # Output:
+    #   True if the PR is kept, i.e. it has words & all characters of its user list are legal.
+    #   Words of a dropped PR are still counted in vector space
+    ##############################################################################
+    def __ingest(self, record):
+        vectorBase = self.vectorBase
+        [content, users, startTime, endTime] = record
+        
+        # Generate vector space. cleanContent is the list of indices of the words in vector space
+        cleanContent = []
+        # words already counted for this PR
+        countedWords = set()
+        # iterate each word & its stem
+        for word, stword in content:
+            ind = vectorBase.find(stword)
+            # if it is a new word founded, add a new dimension to the vector space
+            if (ind < 0):
+                ind = vectorBase.add(stword)
+            # else, add the appearance count of the word on its first appearance in the PR
+            elif (word not in countedWords):
+                vectorBase.addCount(ind)
+            countedWords.add(word)
+            cleanContent.append(ind)
+        
+        # If the PR has no words or illegal characters, drop it
+        if (len(cleanContent) == 0) or not judgeLegal(users):
+            return False
+        
+        # Get the time of PR and process it into consistent format
+        startTime = parseTime(startTime)
+        endTime = parseTime(endTime)
+        if (startTime < self.firstTime):
+            self.firstTime = startTime
+        if (endTime > self.deadline):
+            self.deadline = endTime
+        
+        # Get authors involved in this PR. Add them into the author list of the project
+        usrList = []
+        for eachAuthor in users.split(","):
+            self.authors.add(eachAuthor)
+            usrList.append(self.authors.index(eachAuthor))
+            
+        # Append processed PR into the PR store. Only the indices of words after stopwords removed are kept
+        self.PRs.append(cleanContent, usrList, startTime, endTime)
+        return True
+
+    ##############################################################################
+    # Re-weighting step: calculate all scores again from the PRs kept in the model
+    #
+    # tfidf values depend on the number of PRs & the appearance counts of words, and
+    # common network scores on the baseline & deadline time of all PRs. PRs added by
+    # addPR() are scored with the values at the time they were added. This step brings
+    # every score up to date, as if the model had been trained from all its PRs at once.
+    # Contents are not cleaned again, so it is much cheaper than train().
+    ##############################################################################
+    def reweight(self):
+        self.thaw()
+        PRs = self.PRs
+        
+        # Part A Score. Calculate tfidf for each PR and get its score in the vector space
+        self.vectorScore = vectorSpace.tfidfTerms([PRs.getTerms(i) for i in range(len(PRs))], self.vectorBase, len(PRs))
+        self.vectorModel = []
+        for each in self.vectorScore:
+            self.vectorModel.append(expertise.model(each))
+        self.prIndex = InvertedIndex(self.vectorScore, self.vectorModel)
+        self.__buildANN()
+        self.__trainMatrix = None
+        
+        # Part C Score. Calculate common network scores among authors.
+        self.baseline = self.firstTime - 24 * 3600
+        self.relationScore = self.authors.makeRelations(PRs, self.baseline, self.deadline)
+        
+        self.pending = 0
+        self.modified = True
+        return 0
+
+    ##############################################################################
+    # Incremental training: add one new PR into the trained model
+    #
+    # Input:
+    #   title, content: raw title & content of the PR
+    #   users: comma separated user list, the contributor first
+    #   startTime, endTime: times in seconds, or strings as in the .csv files
+    #
+    # Output:
+    #   index of the PR in the model, or -1 if the PR is dropped
+    #
+    # Vector space, the author list and common networks are updated in place, and the
+    # PR is scored with the current tfidf & time normalisation. Older scores are left
+    # as they are until reweight(), which is called on the next query once
+    # reweightRatio * (number of PRs) PRs have been added since the last one.
+    ##############################################################################
+    def addPR(self, title, content, users, startTime, endTime):
+        return self.addRecord(ingest.makeRecord(title, content, users, startTime, endTime))
+
+    # same as addPR(), for a PR already cleaned into a compact record (see ingest.py)
+    def addRecord(self, record):
+        self.thaw()
+        if not self.__ingest(record):
+            return -1
+        i = len(self.PRs) - 1
+        
+        # score of the new PR
+        vector = vectorSpace.tfidfTerms([self.PRs.getTerms(i)], self.vectorBase, len(self.PRs))[0]
+        mod = expertise.model(vector)
+        self.vectorScore.append(vector)
+        self.vectorModel.append(mod)
+        self.prIndex.add(i, vector, mod)
+        if self.annIndex is not None:
+            self.annIndex.add(i, vector, mod)
+        self.__trainMatrix = None
+        
+        # the first PRs of an empty model fix the baseline
+        if self.pending == i:
+            self.baseline = self.firstTime - 24 * 3600
+        self.authors.addRelations(self.PRs.getUsers(i), self.PRs.getEnd(i), self.baseline, self.deadline)
+        
+        self.pending += 1
+        self.modified = True
+        return i
+
+    # add several PRs, given as rows [title, content, users, startTime, endTime]. Return their indices
+    def addPRs(self, rows):
+        return [self.addPR(*row) for row in rows]
+
+    # call reweight() if enough PRs have been added since the last re-weighting
+    def refresh(self):
+        if self.pending > 0 and self.reweightRatio is not None and self.pending > self.reweightRatio * len(self.PRs):
+            self.reweight()
+        return 0
+
+    # turn a model loaded from a file into in-memory structures that can be changed
+    def thaw(self):
+        if not self.__mapped:
+            return 0
+        self.__mapped = False
+        self.vectorBase.load(self.vectorBase.getWords(), array('l', self.vectorBase.getCounts()))
+        self.PRs.thaw()
+        self.vectorScore = list(self.vectorScore)
+        self.vectorModel = list(self.vectorModel)
+        self.prIndex = InvertedIndex(self.vectorScore, self.vectorModel)
+        self.__buildANN()
+        self.relationScore = self.authors.setRelations([dict(row) for row in self.relationScore])
+        return 0
+
+    ##############################################################################
+    # Use approximate search of the closest PRs, by random-projection LSH (see lsh.py)
+    #
+    # bits, tables, probes & seed are the parameters of lsh.SimHashIndex. Fewer bits,
+    # more tables or more probes give a better recall of the closest PRs but a slower search.
+    # Call useANN(None) to go back to exact search. Batch scoring is always exact, so test() refuses
+    # batch mode while approximate search is used
+    ##############################################################################
+    def useANN(self, bits = lsh.defaultParams[0], tables = lsh.defaultParams[1], probes = lsh.defaultParams[2], seed = 0):
+        if bits is None:
+            self.annParams = None
+        else:
+            self.annParams = {"bits": bits, "tables": tables, "probes": probes, "seed": seed}
+        self.__buildANN()
+        return 0
+
+    # build the approximate index of the current vector scores, if approximate search is used
+    def __buildANN(self):
+        self.annIndex = None
+        if self.annParams is not None:
+            self.annIndex = lsh.SimHashIndex(self.vectorScore, self.vectorModel, **self.annParams)
+        return 0
+
+    # Save the trained model of the project into a file. source is the hash of the training dataset
+    def save(self, path, source):
+        model = {"vectorBase": self.vectorBase, "PRs": self.PRs, "vectorScore": self.vectorScore, "vectorModel": self.vectorModel,
+                 "prIndex": self.prIndex, "authors": self.authors, "relationScore": self.relationScore,
+                 "baseline": self.baseline, "deadline": self.deadline}
+        result = modelStore.save(path, source, model)
+        self.modified = False
+        return result
+
+    # Load the trained model of a project from a file saved by save()
+    # Return False if the file is missing or was built from another training dataset
+    def load(self, path, source):
+        model = modelStore.load(path, source)
+        if model is None:
+            return False
+        arrays = model["arrays"]
+        strings = model["strings"]
+        self.clear()
+        
+        self.vectorBase.load(strings["words"], arrays["wordCounts"])
+        self.vectorScore = modelStore.SparseRows(arrays["vectorOffsets"], arrays["vectorCols"], arrays["vectorValues"])
+        self.vectorModel = arrays["vectorModel"]
+        self.prIndex = InvertedIndex(self.vectorScore, self.vectorModel, [arrays["postingTerms"], arrays["postingMin"], arrays["postingMax"], arrays["postingOffsets"], arrays["postingIds"], arrays["postingWeights"]])
+        self.__buildANN()
+        self.__trainMatrix = None
+        
+        # names are saved in id order
+        for name in strings["authors"]:
+            self.authors.add(name)
+        self.relationScore = modelStore.SparseRows(arrays["relationOffsets"], arrays["relationCols"], arrays["relationValues"])
+        
+        self.PRs.load({name: arrays["PR." + name] for name in self.PRs.getArrays()})
+        self.baseline = model["baseline"]
+        self.firstTime = self.baseline + 24 * 3600
+        self.deadline = model["deadline"]
+        
+        # arrays are memoryviews of the file until the model is changed
+        self.__mapped = True
+        return True
+
+    # Load the model of a training dataset from the model folder.
+    # If there is no model built from the same file yet, train it and save it into the folder
+    def loadOrTrain(self, file, modelDir, retrain = False):
+        source = modelStore.fileHash(file)
+        path = modelStore.modelPath(modelDir, file)
+        if (not retrain) and self.load(path, source):
+            return 0
+        self.train(file)
+        self.save(path, source)
+        return 0
+
+    # Get vector score of cleaned PR contents in the vector space generated from the training dataset
+    # Return [testScore, testModel]: the sparse vector score & its model
+    def vectorize(self, cleanContent):
+        self.refresh()
+        testScore = vectorSpace.tfidf([[None, cleanContent]], self.vectorBase, len(self.PRs))[0]
+        return [testScore, expertise.model(testScore)]
+
+    # The legal testcases among compact records (see ingest.py): PRs with words & legal user lists.
+    # Yield (dedic, testScore, testModel) for each, dedic being all authors of the PR, the contributor first
+    def testcases(self, records):
+        for content, users, startTime, endTime in records:
+            # Get the merged contents after stopwords removed
+            cleanContent = [stword for word, stword in content]
+            if (len(cleanContent)>0) and judgeLegal(users):
+                [testScore, testModel] = self.vectorize(cleanContent)
+                yield (users.split(","), testScore, testModel)
+
+    # Find the r closest PRs in training dataset based on cosine similarities of vector scores
+    # r defaults to self.r. The result for a smaller r is a prefix of the result for a larger one
+    # The approximate index is used if useANN() was called, unless exact is True
+    # Return a list of [score, ind], ind being the index of PR in training dataset
+    def similarPRs(self, testScore, testModel, r = None, exact = False):
+        if r is None:
+            r = self.r
+        if metrics.enabled:
+            metrics.count("queries")
+        if (testModel <= self.minRel):
+            return []
+        index = self.prIndex
+        if self.annIndex is not None and not exact:
+            index = self.annIndex
+        topR = TopK(r)
+        # cosine similarities with each PR in training dataset sharing words with the testcase
+        related = index.search(testScore, testModel, r, self.minRel)
+        for score, i in related:
+            topR.push(score, i)
+        if metrics.enabled:
+            metrics.count("nonzeroSimilarities", len(related))
+        
+        # Get k largest ones.
+        return topR.result()
+
+    # Find the r closest PRs of several testcases at once by sparse matrix products (see batchScore.py)
+    # The matrix of training PRs is kept until the model changes
+    # Return one list of [score, ind] per testcase, the same as similarPRs() with exact search
+    def similarPRsBatch(self, testScores, testModels):
+        if self.__trainMatrix is None:
+            self.__trainMatrix = batchScore.trainingMatrix(self.vectorScore, self.vectorModel, self.vectorBase.length())
+        batchTopR = batchScore.topSimilar(self.vectorScore, self.vectorModel, testScores, testModels, self.vectorBase.length(), self.r, self.minRel, trainMatrix=self.__trainMatrix)
+        return [[] if testModel <= self.minRel else topR for testModel, topR in zip(testModels, batchTopR)]
+
+    ##############################################################################
+    # Rank authors for a PR
+    #
+    # Input:
+    #   topR: the closest PRs from similarPRs(), giving Expertise Scores to their authors
+    #   contributor: the one who submit the PR, giving common network scores to related authors
+    #   K: number of authors, self.K by default
+    #   relationScore: common network scores to use instead of self.relationScore, e.g. built with other hyperparameters
+    #
+    # Output:
+    #   list of [score, id] of the K best authors, ties being broken by dictionary order of author names.
+    #   There are fewer than K when fewer authors have a score. The result for a smaller K is a prefix of it
+    ##############################################################################
+    def rankAuthors(self, topR, contributor, K = None, relationScore = None):
+        if K is None:
+            K = self.K
+        if relationScore is None:
+            relationScore = self.relationScore
+        authors = self.authors
+        # total scores of the authors touched by this PR. Other authors score 0 and are never recommended
+        totalScore = {}
+        
+        # For each PR in k largest similarity PRs. sc being the similarity score, ind being the index of PR in training dataset
+        for sc, ind in topR:
+        
+            # if the score is equal to 0, there is no relation, which happens when only fewer than k PRs in training dataset are related to the testcase
+            if sc == 0 or ind == -1:
+                continue    
+        
+            # Get authors related to the training PR and add Expertise Scores for them
+            for usrid in self.PRs.getUsers(ind):
+                totalScore[usrid] = totalScore.get(usrid, 0.0) + sc
+        
+        # get his id in the author list generated from training data. 
+        # If the contributor doesn't exist in the author list, existance will get a value of False, otherwise True
+        [con_id, existance] = authors.find(contributor)
+        
+        # Add common network scores for each author related to the contributor,
+        # if the contributor exists in the author list from training dataset
+        if existance:
+            for i, sc in relationScore[con_id].items():
+                totalScore[i] = totalScore.get(i, 0.0) + sc
+        
+        # ties are broken by dictionary order of author names
+        authorOrder = authors.ordered()
+        authorRank = authors.ranks()
+        topKusr = TopK(K)
+        for i, sc in totalScore.items():
+            topKusr.push(sc, authorRank[i])
+        if metrics.enabled:
+            metrics.count("authorsTouched", len(totalScore))
+            
+        # Get k largest ones
+        return [[sc, authorOrder[rank]] for sc, rank in topKusr.result()]
+
+    # Expertise Scores & common network scores of the given author ids for a PR, the two parts of their scores in rankAuthors()
+    # Return [expertise, network]: two dicts mapping each id to its part
+    def scoreParts(self, topR, contributor, ids, relationScore = None):
+        if relationScore is None:
+            relationScore = self.relationScore
+        expertiseScore = {i: 0.0 for i in ids}
+        networkScore = {i: 0.0 for i in ids}
+        for sc, ind in topR:
+            if sc == 0 or ind == -1:
+                continue
+            for usrid in self.PRs.getUsers(ind):
+                if usrid in expertiseScore:
+                    expertiseScore[usrid] += sc
+        [con_id, existance] = self.authors.find(contributor)
+        if existance:
+            relations = relationScore[con_id]
+            for i in ids:
+                networkScore[i] = relations.get(i, 0.0)
+        return [expertiseScore, networkScore]
+
+    ##############################################################################
+    # Recommend reviewers for new PRs
+    #
+    # Input:
+    #   prs: list of [title, content, contributor] of the PRs
+    #   K: number of reviewers recommended for each PR, self.K by default
+    #
+    # Output:
+    #   one list per PR of the recommended reviewers, best first, as
+    #   [name, score, expertise, network]: the total score & its two parts
+    #
+    # Closest PRs of several PRs are found at once by sparse matrix products if
+    # numpy & scipy are installed and exact search is used, one by one otherwise.
+    ##############################################################################
+    def recommend(self, prs, K = None):
+        self.refresh()
+        testcases = []
+        for title, content, contributor in prs:
+            [testScore, testModel] = self.vectorize(textClean.clean(title, content))
+            testcases.append([contributor, testScore, testModel])
+        
+        if len(testcases) > 1 and self.annIndex is None and batchScore.available():
+            batchTopR = self.similarPRsBatch([each[1] for each in testcases], [each[2] for each in testcases])
+        else:
+            batchTopR = [self.similarPRs(testScore, testModel) for contributor, testScore, testModel in testcases]
+        
+        results = []
+        for [contributor, testScore, testModel], topR in zip(testcases, batchTopR):
+            topKusr = self.rankAuthors(topR, contributor, K)
+            [expertiseScore, networkScore] = self.scoreParts(topR, contributor, [ind for sc, ind in topKusr])
+            results.append([[self.authors.getName(ind), sc, expertiseScore[ind], networkScore[ind]] for sc, ind in topKusr])
+        return results
+
+    # Running test dataset
+    # file is a path, "-" for stdin or an open file. It is read as a stream (see ingest.py)
+    # In batch mode, similarities of batchSize testcases at a time are computed by sparse matrix products (see batchScore.py)
+    # The PRs of the dataset can be split into chunks: only the n-th PRs with n % chunks == chunk are tested
+    # Return [predictCnt, correctCnt, actualCnt] of the test dataset
+    def test(self, file, batch = False, chunk = 0, chunks = 1, batchSize = 4096):
+        if batch and self.annIndex is not None:
+            raise ValueError("batch scoring is exact and cannot be used with approximate search")
+        self.refresh()
+        # [predictCnt, correctCnt, actualCnt]
+        counts = [0, 0, 0]
+        
+        # Legal testcases waiting for batch scoring: [dedic, testScore, testModel]
+        testcases = []
+        
+        # For each PR in test dataset which has words & all characters legal
+        for dedic, testScore, testModel in self.testcases(ingest.records(file, chunk, chunks)):
+            if batch:
+                testcases.append([dedic, testScore, testModel])
+                if len(testcases) >= batchSize:
+                    self.__testBatch(testcases, counts)
+                    testcases = []
+            else:
+                start = time.perf_counter() if metrics.enabled else 0.0
+                # Find k closest PRs based on cosine similarities of vector scores
+                self.__check(dedic, self.similarPRs(testScore, testModel), counts)
+                if metrics.enabled:
+                    metrics.observe("queryLatency", time.perf_counter() - start)
+        
+        if testcases:
+            self.__testBatch(testcases, counts)
+        return counts
+
+    # find the r closest PRs of several testcases at once, then check their results
+    def __testBatch(self, testcases, counts):
+        start = time.perf_counter() if metrics.enabled else 0.0
+        batchTopR = self.similarPRsBatch([each[1] for each in testcases], [each[2] for each in testcases])
+        for [dedic, testScore, testModel], topR in zip(testcases, batchTopR):
+            self.__check(dedic, topR, counts)
+        if metrics.enabled:
+            metrics.observe("batchLatency", time.perf_counter() - start)
+
+    # predict authors of a testcase given its closest PRs, and add the result into counts
+    # dedic is the list of all authors related in this testcase PR
+    def __check(self, dedic, topR, counts):
+        # Calculate Expertise Scores & common network scores for authors. dedic[0] submits the testcase PR
+        self.countPrediction(dedic, self.rankAuthors(topR, dedic[0]), counts)
+    
+    # add the authors predicted for a testcase into counts, dedic being all authors related in the testcase PR
+    def countPrediction(self, dedic, topKusr, counts):
+        # K closest authors to the testcase PR are predicted. Add them into the predict counter. For Precision
+        counts[0] += len(topKusr)
+        # sc being the total score of the author, ind being its id in author list
+        for sc, ind in topKusr:
+            # if the author predicted is in the testcase result, it is correctly predicted
+            if self.authors.getName(ind) in dedic:
+                counts[1] += 1
+            
+        # Add all authors related to this testcase PR into counters for Recall
+        counts[2] += len(set(dedic))
@@ -0,0 +1,232 @@
+import os
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+
+from recommender import Recommender
+import modelStore
+
+###############################################################################
+# Registry of the models of several projects
+#
+# Projects are loaded on first use (see Recommender.loadOrTrain()) and kept
+# side by side in least recently used order. When their total memory goes
+# over the budget, the least recently used ones are evicted. An evicted
+# project is loaded again from its saved model the next time it is used.
+# Models changed since they were saved (see Recommender.addPR()) are saved
+# before being evicted, so no change is lost. They are saved apart from the
+# models of the training datasets (see modelStore.changedPath()), keyed by
+# the PRs they hold, and only the registry loads them again.
+#
+# Words of all vocabularies are interned into one table, so a stem used by
+# several projects is stored once. Its memory is reported apart as "shared".
+#
+# The registry can be used from several threads.
+###############################################################################
+
+##############################################################################
+# Estimate the memory used by an object & everything it refers to, in bytes
+#
+# Input:
+#   obj: the object
+#   seen: ids of objects already counted, which are not counted again
+#   shared: dict of shared objects (e.g. interned words) not counted
+#
+# Buffers of memoryviews are counted by their size, whether they are in
+# memory or mapped from a file.
+##############################################################################
+def memorySize(obj, seen = None, shared = None):
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        each = stack.pop()
+        if id(each) in seen:
+            continue
+        seen.add(id(each))
+        if isinstance(each, str):
+            if shared is not None and shared.get(each) is each:
+                continue
+            total += sys.getsizeof(each)
+        elif isinstance(each, memoryview):
+            total += sys.getsizeof(each) + each.nbytes
+        elif isinstance(each, (int, float, bool, bytes, array)) or each is None:
+            total += sys.getsizeof(each)
+        elif isinstance(each, dict):
+            total += sys.getsizeof(each)
+            stack.extend(each.keys())
+            stack.extend(each.values())
+        elif isinstance(each, (list, tuple, set, frozenset)):
+            total += sys.getsizeof(each)
+            stack.extend(each)
+        elif hasattr(each, "__dict__") and not isinstance(each, type):
+            total += sys.getsizeof(each)
+            stack.append(vars(each))
+        elif hasattr(each, "__slots__"):
+            total += sys.getsizeof(each)
+            for name in each.__slots__:
+                # private slots are mangled with the class name
+                if name.startswith("__"):
+                    name = "_" + type(each).__name__ + name
+                if hasattr(each, name):
+                    stack.append(getattr(each, name))
+        else:
+            total += sys.getsizeof(each)
+    return total
+
+class ModelRegistry(object):
+
+    # projects: dict mapping the name of each project to its folder, holding training_data.csv
+    # budget: maximum memory of all loaded models in bytes. None for no limit
+    # the other arguments are given to every Recommender
+    def __init__(self, projects, modelDir = "./models/", budget = None, **options):
+        self.__projects = projects
+        self.__modelDir = modelDir
+        self.__budget = budget
+        self.__options = options
+        # name -> Recommender, least recently used first
+        self.__models = OrderedDict()
+        # name -> memory of the model in bytes, computed when loaded
+        self.__sizes = {}
+        # interned words of all vocabularies. Each word maps to itself
+        self.__words = {}
+        # name -> [path, hash of the training dataset, key] of the changed model saved last,
+        # loaded instead of the model of the training dataset
+        self.__changed = {}
+        self.__lock = threading.RLock()
+        # number of times models were loaded & evicted
+        self.loads = 0
+        self.evictions = 0
+
+    def getProjects(self):
+        return sorted(self.__projects)
+
+    def getBudget(self):
+        return self.__budget
+
+    # names of the loaded projects, least recently used first
+    def loaded(self):
+        with self.__lock:
+            return list(self.__models)
+
+    def __file(self, name):
+        return os.path.join(self.__projects[name], "training_data.csv")
+
+    # train or load the model of a project, without keeping it in the registry (see put()).
+    # Its changed model is loaded if one was saved, unless the training dataset changed since
+    def load(self, name):
+        if name not in self.__projects:
+            raise KeyError("unknown project " + str(name))
+        with self.__lock:
+            changed = self.__changed.get(name)
+        file = self.__file(name)
+        recommender = Recommender(**self.__options)
+        if changed is not None:
+            path, source, key = changed
+            if source == modelStore.fileHash(file) and recommender.load(path, key):
+                return recommender
+        recommender.loadOrTrain(file, self.__modelDir)
+        return recommender
+
+    # the model of a project, loaded if needed. It becomes the most recently used.
+    # The registry is not locked while loading, which may take as long as training
+    def get(self, name):
+        with self.__lock:
+            recommender = self.__models.get(name)
+            if recommender is not None:
+                self.__models.move_to_end(name)
+                return recommender
+        recommender = self.load(name)
+        with self.__lock:
+            # loaded by another thread in the meantime
+            loaded = self.__models.get(name)
+            if loaded is not None:
+                self.__models.move_to_end(name)
+                return loaded
+            self.__put(name, recommender)
+            return recommender
+
+    # replace the model of a project by the given one, e.g. loaded again on another thread
+    def put(self, name, recommender):
+        with self.__lock:
+            self.__put(name, recommender)
+        return recommender
+
+    # load the model of a project again from its files
+    def reload(self, name):
+        return self.put(name, self.load(name))
+
+    def __put(self, name, recommender):
+        recommender.vectorBase.intern(self.__words)
+        self.__models[name] = recommender
+        self.__models.move_to_end(name)
+        self.__sizes[name] = memorySize(recommender, shared=self.__words)
+        self.loads += 1
+        self.__shrink(name)
+
+    # evict least recently used models until the budget is met. keep is never evicted
+    def __shrink(self, keep = None):
+        if self.__budget is None:
+            return 0
+        for name in list(self.__models):
+            if self.usage() <= self.__budget:
+                break
+            if name != keep:
+                self.evict(name)
+        return 0
+
+    # remove the model of a project from memory, saving it first if it changed
+    def evict(self, name):
+        with self.__lock:
+            recommender = self.__models.pop(name, None)
+            if recommender is None:
+                return False
+            del self.__sizes[name]
+            if recommender.modified:
+                self.__saveChanged(name, recommender)
+            self.evictions += 1
+            return True
+
+    # save the model of a project if it changed since it was loaded or saved
+    def save(self, name):
+        with self.__lock:
+            recommender = self.__models.get(name)
+            if recommender is None or not recommender.modified:
+                return False
+            self.__saveChanged(name, recommender)
+            return True
+
+    # save a changed model apart from the model of its training dataset
+    def __saveChanged(self, name, recommender):
+        file = self.__file(name)
+        source = modelStore.fileHash(file)
+        authors = recommender.authors
+        key = modelStore.changedHash(source, recommender.PRs, recommender.vectorBase.getWords(), [authors.getName(i) for i in range(authors.length())])
+        path = modelStore.changedPath(self.__modelDir, file)
+        recommender.save(path, key)
+        self.__changed[name] = [path, source, key]
+        return path
+
+    # memory of the interned words shared by all vocabularies, in bytes
+    def sharedSize(self):
+        with self.__lock:
+            return sys.getsizeof(self.__words) + sum(sys.getsizeof(word) for word in self.__words)
+
+    # total memory of the loaded models & of the shared words, in bytes
+    def usage(self):
+        with self.__lock:
+            return sum(self.__sizes.values()) + self.sharedSize()
+
+    # memory of every loaded model when it was loaded, in bytes.
+    # Models changed by addPR() afterwards are measured again
+    def memoryReport(self):
+        with self.__lock:
+            report = {}
+            for name, recommender in self.__models.items():
+                if recommender.modified:
+                    self.__sizes[name] = memorySize(recommender, shared=self.__words)
+                report[name] = self.__sizes[name]
+            report["shared"] = self.sharedSize()
+            return report
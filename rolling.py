@@ -0,0 +1,92 @@
+import heapq
+import time
+from collections import deque
+
+from recommender import Recommender, parseTime
+import ingest
+
+###############################################################################
+# Rolling evaluation in time order
+#
+# All PRs of a project are replayed by start time, as in deployment: every PR
+# is recommended with the model of the PRs finished before it started, then
+# added into the model once it is finished itself. The model grows by
+# Recommender.addRecord(), and is only re-weighted when enough PRs were added
+# since the last time (see Recommender.refresh()), so the replay costs about
+# one training & one test, not one training per PR.
+#
+# With a window, PRs finished more than window seconds before the current PR
+# are expired. Expired PRs are dropped in bulk, by training the model again
+# from the cleaned records of the remaining PRs once the expired ones are more
+# than expireRatio of them. Records are cleaned only once.
+###############################################################################
+
+# compact records of all PRs of some datasets (see ingest.py), sorted by start time.
+# Return a list of [startTime, endTime, record]. PRs starting at the same time keep their order
+def timeline(files):
+    events = []
+    for file in files:
+        for record in ingest.records(file):
+            events.append([parseTime(record[2]), parseTime(record[3]), record])
+    events.sort(key=lambda event: event[0])
+    return events
+
+##############################################################################
+# Replay PRs in time order
+#
+# Input:
+#   events: list of [startTime, endTime, record] sorted by start time, see timeline()
+#   window: seconds of history kept in the model, None to keep everything
+#   warmup: number of first PRs only added into the model, without being tested
+#   expireRatio: fraction of expired PRs in the model causing them to be dropped
+#   K, r, reweightRatio: parameters of the Recommender (see recommender.py)
+#
+# Output:
+#   dict of
+#     counts: [predictCnt, correctCnt, actualCnt] of the PRs tested
+#     tested: number of PRs tested
+#     rebuilds: number of times expired PRs were dropped
+#     seconds: time of the replay
+##############################################################################
+def replay(events, window = None, warmup = 0, expireRatio = 0.1, K = 5, r = 10, reweightRatio = 0.1):
+    start = time.perf_counter()
+    recommender = Recommender(K = K, r = r, reweightRatio = reweightRatio)
+    counts = [0, 0, 0]
+    tested = 0
+    rebuilds = 0
+
+    # PRs tested but not finished yet: (endTime, order, record)
+    running = []
+    # records in the model by end time, as [endTime, record]
+    history = deque()
+    # number of the first records of history which are expired
+    expired = 0
+
+    for order, [startTime, endTime, record] in enumerate(events):
+        # PRs finished before this one started are known
+        while running and running[0][0] <= startTime:
+            finished, n, done = heapq.heappop(running)
+            recommender.addRecord(done)
+            history.append([finished, done])
+
+        # drop expired PRs once there are enough of them
+        if window is not None:
+            while expired < len(history) and history[expired][0] < startTime - window:
+                expired += 1
+            if expired > 0 and expired > expireRatio * (len(history) - expired):
+                for n in range(expired):
+                    history.popleft()
+                expired = 0
+                recommender.trainRecords([done for finished, done in history])
+                rebuilds += 1
+
+        # recommend reviewers of the PR from the history only
+        if order >= warmup:
+            for dedic, testScore, testModel in recommender.testcases([record]):
+                topKusr = recommender.rankAuthors(recommender.similarPRs(testScore, testModel), dedic[0])
+                recommender.countPrediction(dedic, topKusr, counts)
+                tested += 1
+
+        heapq.heappush(running, (endTime, order, record))
+
+    return {"counts": counts, "tested": tested, "rebuilds": rebuilds, "seconds": time.perf_counter() - start}
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import os
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+from registry import ModelRegistry
+
+###############################################################################
+# Recommendation server
+#
+# Serves reviewer recommendations of several projects over a local socket,
+# TCP or unix. Requests & responses are JSON objects, one per line:
+#
+#   {"id": 1, "project": "k9", "title": "...", "body": "...", "author": "name", "K": 5}
+#     -> {"id": 1, "project": "k9", "reviewers": [{"name": ..., "score": ..., "expertise": ..., "network": ...}, ...]}
+#        reviewers are best first. score is the sum of the Expertise Score & the common network score
+#   {"id": 2, "op": "reload", "project": "k9"}   project is optional, all projects by default
+#     -> {"id": 2, "reloaded": ["k9"]}
+#   {"id": 3, "op": "projects"}
+#     -> {"id": 3, "projects": ["k9", ...]}
+#
+# A failed request is answered with {"id": ..., "error": "..."}. "id" is
+# optional and copied back as is, since responses of one connection come back
+# in the order they are ready.
+#
+# Models are kept in a ModelRegistry (see registry.py): they are loaded once,
+# and reloaded from their saved files if evicted by the memory budget. Requests waiting at
+# the same time are scored together, so that the closest PRs of a batch are
+# found by one sparse matrix product (see Recommender.recommend()). Scoring
+# runs on one thread besides the event loop, which keeps accepting requests.
+# A reload builds the new model on another thread and replaces the old one
+# once ready: connections & requests in progress are not interrupted.
+# SIGHUP reloads all projects.
+###############################################################################
+class ReviewerServer(object):
+
+    # maximum length of a request line. PR bodies can be long
+    lineLimit = 1 << 24
+
+    # projects: dict mapping the name of each project to its folder, holding training_data.csv
+    # batchSize: maximum number of requests scored together
+    # batchDelay: seconds waited for more requests before scoring a batch
+    # budget: memory of the loaded models in bytes, None for no limit
+    def __init__(self, projects, modelDir = "./models/", K = 5, batchSize = 64, batchDelay = 0.005, budget = None):
+        self.__projects = projects
+        self.__batchSize = batchSize
+        self.__batchDelay = batchDelay
+        # Recommender of each project
+        self.__models = ModelRegistry(projects, modelDir, budget, K = K)
+        # requests waiting to be scored: [project, [title, body, author], K, future]
+        self.__queue = None
+        # a single thread scores, so a model is never used by two batches at once
+        self.__scorer = ThreadPoolExecutor(max_workers=1)
+        self.__loader = ThreadPoolExecutor(max_workers=1)
+        self.__server = None
+        self.__batcherTask = None
+
+    def getProjects(self):
+        return sorted(self.__projects)
+
+    def getRegistry(self):
+        return self.__models
+
+    # (re)load models of the given projects, all by default. Return their names
+    async def reload(self, names = None):
+        if names is None:
+            names = self.getProjects()
+        loop = asyncio.get_running_loop()
+        for name in names:
+            if name not in self.__projects:
+                raise KeyError("unknown project " + name)
+            # the new model is measured & put in place on the loader thread too, since
+            # it may evict & save other models: the event loop never waits on the registry
+            await loop.run_in_executor(self.__loader, self.__models.reload, name)
+        return names
+
+    # score a batch of requests of the same project & K. Run on the scorer thread,
+    # where an evicted model is loaded again
+    def __score(self, name, prs, K):
+        return self.__models.get(name).recommend(prs, K)
+
+    # collect waiting requests into batches & score them
+    async def __batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.__queue.get()]
+            deadline = loop.time() + self.__batchDelay
+            while len(batch) < self.__batchSize:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.__queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # requests of one project with the same K are scored together
+            groups = {}
+            for each in batch:
+                groups.setdefault((each[0], each[2]), []).append(each)
+            for (name, K), items in groups.items():
+                try:
+                    results = await loop.run_in_executor(self.__scorer, self.__score, name, [each[1] for each in items], K)
+                except Exception:
+                    # score the requests one by one, so that a bad one only fails itself
+                    for each in items:
+                        try:
+                            [result] = await loop.run_in_executor(self.__scorer, self.__score, name, [each[1]], K)
+                        except Exception as error:
+                            if not each[3].done():
+                                each[3].set_exception(error)
+                            continue
+                        if not each[3].done():
+                            each[3].set_result(result)
+                    continue
+                for each, result in zip(items, results):
+                    if not each[3].done():
+                        each[3].set_result(result)
+
+    # recommend reviewers for one PR. Return a list of [name, score, expertise, network]
+    async def recommend(self, name, title, body, author, K = None):
+        if name not in self.__projects:
+            raise KeyError("unknown project " + str(name))
+        for field, value in [["title", title], ["body", body], ["author", author]]:
+            if not isinstance(value, str):
+                raise TypeError("%s must be a string" % field)
+        if K is not None and (not isinstance(K, int) or isinstance(K, bool) or K <= 0):
+            raise ValueError("K must be a positive integer")
+        future = asyncio.get_running_loop().create_future()
+        await self.__queue.put([name, [title, body, author], K, future])
+        return await future
+
+    # answer one request line
+    async def __answer(self, line):
+        response = {}
+        try:
+            request = json.loads(line)
+            if "id" in request:
+                response["id"] = request["id"]
+            op = request.get("op", "recommend")
+            if op == "recommend":
+                reviewers = await self.recommend(request.get("project"), request.get("title", ""), request.get("body", ""), request.get("author", ""), request.get("K"))
+                response["project"] = request["project"]
+                response["reviewers"] = [{"name": name, "score": score, "expertise": expertise, "network": network} for name, score, expertise, network in reviewers]
+            elif op == "reload":
+                project = request.get("project")
+                response["reloaded"] = await self.reload(None if project is None else [project])
+            elif op == "projects":
+                response["projects"] = self.getProjects()
+            else:
+                raise ValueError("unknown op " + str(op))
+        except Exception as error:
+            response["error"] = "%s: %s" % (type(error).__name__, error)
+        return response
+
+    # serve one connection. Its requests are answered concurrently
+    async def __handle(self, reader, writer):
+        lock = asyncio.Lock()
+        tasks = set()
+
+        async def answer(line):
+            response = await self.__answer(line)
+            async with lock:
+                writer.write((json.dumps(response) + "\n").encode("utf-8"))
+                await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.ensure_future(answer(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # load all models & listen on a TCP port of host, or on a unix socket if path is given
+    async def start(self, host = "127.0.0.1", port = 8765, path = None):
+        self.__queue = asyncio.Queue()
+        await self.reload()
+        self.__batcherTask = asyncio.ensure_future(self.__batcher())
+        if path is not None:
+            self.__server = await asyncio.start_unix_server(self.__handle, path, limit=self.lineLimit)
+        else:
+            self.__server = await asyncio.start_server(self.__handle, host, port, limit=self.lineLimit)
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(self.reload()))
+        except (NotImplementedError, AttributeError, RuntimeError):
+            pass
+        return self.__server
+
+    # start & serve until cancelled
+    async def serve(self, host = "127.0.0.1", port = 8765, path = None):
+        server = await self.start(host, port, path)
+        async with server:
+            await server.serve_forever()
+
+# projects to serve from the project folders (see evaluate.listProjects()), named by their folder
+def projectsOf(folders):
+    return {os.path.basename(os.path.normpath(each)): each for each in folders}
@@ -0,0 +1,73 @@
+import itertools
+
+import ingest
+
+###############################################################################
+# Hyperparameter sweep
+#
+# Tests a trained Recommender for every combination of K, r, relationConst &
+# lam in one pass over the test dataset. Similarities of each testcase are
+# computed once for the largest r: the r closest PRs are a prefix of them, and
+# the K best authors are a prefix of the best max(K) ones. Common network
+# scores are built once per (relationConst, lam) from the training PRs.
+###############################################################################
+
+# header of the table printed by formatTable()
+columns = ["K", "r", "relationConst", "lam", "predictCnt", "correctCnt", "actualCnt", "Precision", "Recall"]
+
+# every configuration of the grids, as tuples (K, r, relationConst, lam)
+def configurations(Ks, rs, relationConsts = (1.0,), lams = (0.8,)):
+    return list(itertools.product(Ks, rs, relationConsts, lams))
+
+##############################################################################
+# Test a trained recommender for every configuration of the grids
+#
+# Input:
+#   recommender: a trained or loaded Recommender (see recommender.py)
+#   file: the test dataset, as accepted by Recommender.test()
+#   Ks, rs, relationConsts, lams: lists of values of each hyperparameter
+#
+# Output:
+#   dict mapping each configuration (K, r, relationConst, lam) to
+#   [predictCnt, correctCnt, actualCnt], the same as Recommender.test() would
+#   return with these hyperparameters
+##############################################################################
+def sweep(recommender, file, Ks, rs, relationConsts = (1.0,), lams = (0.8,), chunk = 0, chunks = 1):
+    recommender.refresh()
+    maxK = max(Ks)
+    maxR = max(rs)
+    results = {config: [0, 0, 0] for config in configurations(Ks, rs, relationConsts, lams)}
+
+    # common network scores of each (relationConst, lam). The ones of the recommender are kept as they are
+    relations = {}
+    for relationConst, lam in itertools.product(relationConsts, lams):
+        relations[(relationConst, lam)] = recommender.authors.buildRelations(recommender.PRs, recommender.baseline, recommender.deadline, relationConst, lam)
+
+    for dedic, testScore, testModel in recommender.testcases(ingest.records(file, chunk, chunks)):
+        # the closest PRs for the largest r, in descending order
+        topR = recommender.similarPRs(testScore, testModel, maxR)
+        for r in set(rs):
+            for (relationConst, lam), relationScore in relations.items():
+                topKusr = recommender.rankAuthors(topR[:r], dedic[0], maxK, relationScore)
+                for K in set(Ks):
+                    recommender.countPrediction(dedic, topKusr[:K], results[(K, r, relationConst, lam)])
+    return results
+
+# merge the results of several projects or chunks returned by sweep()
+def mergeResults(results):
+    total = {}
+    for each in results:
+        for config, counts in each.items():
+            merged = total.setdefault(config, [0, 0, 0])
+            for i in range(3):
+                merged[i] += counts[i]
+    return total
+
+# lines of a table with one row per configuration, in the order of the grids
+def formatTable(results, sep = "\t"):
+    lines = [sep.join(columns)]
+    for config, counts in results.items():
+        precision = float(counts[1])/counts[0] if counts[0] else 0.0
+        recall = float(counts[1])/counts[2] if counts[2] else 0.0
+        lines.append(sep.join(str(each) for each in list(config) + counts + [precision, recall]))
+    return lines
@@ -0,0 +1,42 @@
+import expertise
+from recommender import Recommender
+
+# a PR record as made by ingest.records(): [[word, stem] pairs, users, startTime, endTime]
+def record(words, users, day):
+    return [words, users, "2020-01-%02d 00:00:00" % day, "2020-01-%02d 12:00:00" % day]
+
+def others(prefix):
+    return [[prefix + str(n), prefix + str(n)] for n in range(20)]
+
+# Stem variants within one PR are counted in the document frequency, so "bb" is
+# counted in more documents than there are PRs, and its weights are negative.
+# The search must still find the PR closest to a query made of "aa" & "bb".
+def testNegativeWeights():
+    records = [
+        record([["aa", "aa"]] + others("x"), "alice,bob", 1),
+        record([["b1", "bb"], ["b2", "bb"], ["b3", "bb"]], "carol,dave", 2),
+        record([["b4", "bb"]] + others("y"), "erin,frank", 3),
+    ]
+    recommender = Recommender(r = 1)
+    recommender.trainRecords(records)
+
+    testScore, testModel = recommender.vectorize(["aa", "bb"])
+    exact = [[expertise.cos(recommender.vectorScore[i], testScore, recommender.vectorModel[i], testModel), i] for i in range(len(recommender.vectorScore))]
+    best = max(exact, key=lambda each: each[0])
+
+    found = recommender.similarPRs(testScore, testModel)
+    assert [i for score, i in found] == [best[1]]
+    assert abs(found[0][0] - best[0]) < 1e-9
+    assert [i for score, i in recommender.similarPRsBatch([testScore], [testModel])[0]] == [best[1]]
+
+# no PR is needed when r is 0, as with batch scoring
+def testNoPRs():
+    recommender = Recommender(r = 0)
+    recommender.trainRecords([record([["aa", "aa"]] + others("x"), "alice,bob", 1), record([["aa", "aa"]] + others("y"), "carol,dave", 2)])
+    testScore, testModel = recommender.vectorize(["aa", "x1"])
+    assert recommender.similarPRs(testScore, testModel) == []
+    assert recommender.similarPRsBatch([testScore], [testModel]) == [[]]
+
+if __name__ == "__main__":
+    testNegativeWeights()
+    testNoPRs()
@@ -0,0 +1,11 @@
+from recommender import Recommender
+
+# The first PR added is dropped for its non-ASCII user list, but its words are
+# counted: tfidf must not divide by a training dataset of 0 PRs.
+def testOnlyDroppedPRs():
+    recommender = Recommender()
+    assert recommender.addPR("Fix crash on start", "The app crashes", "José,bob", "2020-01-01 00:00:00", "2020-01-01 12:00:00") == -1
+    assert recommender.recommend([["Fix crash", "It crashes on start", "alice"]]) == [[]]
+
+if __name__ == "__main__":
+    testOnlyDroppedPRs()
@@ -0,0 +1,242 @@
+import os
+import re
+import time
+from collections import Counter
+from functools import lru_cache
+
+###############################################################################
+# Cleaning of PR contents: tokenize -> lowercase -> stem -> remove stopwords
+#
+# Shared by training and testing. The decision for a word only depends on the
+# word itself, and by Zipf's law most words of a project are repeats, so the
+# stem of every word (or None if the word is dropped) is kept in a bounded LRU
+# cache. cacheStats() reports how often the cache is hit.
+#
+# NLTK & stop_words take seconds to import, so they are only imported when
+# first needed: the stemmer on the first word cleaned, word_tokenize on the
+# first PR tokenized. The stopword set is read from the frozen file
+# stopwords.txt, written by freezeStopwords(), and only built from NLTK &
+# stop_words if the file is missing.
+###############################################################################
+
+# stopwords added to the ones of NLTK & stop_words
+stop_Add = set(["et", "al", "etc", "add", "delete", "note", "thank", "another", "please", "per", "test", "implement", "complete", "hello", "fix", "say", "said", "would", "one", "back", "could", "thought", "think", "see", "seem", "want", "like", "still", "go", "went", "around", "make", "made", "come", "came", "hi", "much", "wa", "well", "though", "only", "onli", "might", "away", "even", "know", "many", "good", "get", "got", "right", "must", "great", "us", "something", "yet", "app", "use", "really", "day", "put", "set", "ok"])
+
+# frozen stopword set, one word per line
+stopwordFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stopwords.txt")
+
+# loaded on first use by stopwords() & stemmer()
+stopW = None
+p_stemmer = None
+word_tokenize = None
+
+# generate stopwords set as preparation of cleaning PR contents, from NLTK & stop_words
+def buildStopwords():
+    from nltk.corpus import stopwords
+    from stop_words import get_stop_words
+    stop_nltk = set(stopwords.words("english"))
+    stop_sw = set(get_stop_words('en'))
+    return frozenset(stop_nltk.union(stop_Add).union(stop_sw))
+
+# write the stopword set built from NLTK & stop_words into the frozen file
+def freezeStopwords(path = stopwordFile):
+    words = buildStopwords()
+    with open(path, "w", encoding="utf-8") as f:
+        for word in sorted(words):
+            f.write(word + "\n")
+    return len(words)
+
+# the stopword set, read from the frozen file if there is one
+def stopwords():
+    global stopW
+    if stopW is None:
+        if os.path.exists(stopwordFile):
+            with open(stopwordFile, encoding="utf-8") as f:
+                stopW = frozenset(line.rstrip("\n") for line in f if line.strip())
+        else:
+            stopW = buildStopwords()
+    return stopW
+
+# Stemming tools. Used for cleaning PR contents
+def stemmer():
+    global p_stemmer
+    if p_stemmer is None:
+        from nltk.stem.lancaster import LancasterStemmer
+        p_stemmer = LancasterStemmer()
+    return p_stemmer
+
+# default number of words kept in the cache
+defaultCacheSize = 1 << 17
+
+# function to judge if a statement (content/title/author name) only contains general ASCII characters
+def judgeLegal(word):
+    return (len(word)>0) and (all (ord(c)<128 for c in word))
+
+# function to judge if a statement (content/title/author name) only contains English letters
+def judgeEnglish(word):
+    return word.isalpha() and judgeLegal(word)
+
+# return the stem of a word, or None if the word should be removed from the content
+def cleanWordUncached(word):
+    stopW = stopwords()
+    # only legal English words of more than one letter are kept
+    if not (len(word)>1 and judgeEnglish(word)) or (word in stopW):
+        return None
+    lword = word.lower()
+    if lword in stopW:
+        return None
+    stword = stemmer().stem(lword)
+    if stword in stopW:
+        return None
+    return stword
+
+cleanWord = lru_cache(maxsize=defaultCacheSize)(cleanWordUncached)
+
+# change the number of words kept in the cache. The cache is emptied
+def setCacheSize(size):
+    global cleanWord
+    cleanWord = lru_cache(maxsize=size)(cleanWordUncached)
+
+def clearCache():
+    cleanWord.cache_clear()
+
+# hits, misses, hit rate and current size of the cache
+def cacheStats():
+    info = cleanWord.cache_info()
+    total = info.hits + info.misses
+    return {"hits": info.hits, "misses": info.misses, "hitRate": float(info.hits)/total if total else 0.0, "size": info.currsize, "maxSize": info.maxsize}
+
+###############################################################################
+# Tokenizers
+#
+# "nltk": word_tokenize of NLTK, used to build the models of the paper.
+# "fast": a regular expression approximating word_tokenize. Only the words
+#         kept by cleanWord() matter, i.e. words made of letters, so it splits
+#         words at the characters word_tokenize splits at, then splits
+#         contractions & the final period the same way. Words differ from
+#         word_tokenize mostly around abbreviations followed by a period.
+#         compareTokenizers() reports how close both are on a dataset.
+###############################################################################
+
+tokenizers = ["nltk", "fast"]
+tokenizer = "nltk"
+
+def setTokenizer(name):
+    global tokenizer
+    if name not in tokenizers:
+        raise ValueError("unknown tokenizer " + str(name))
+    tokenizer = name
+    return tokenizer
+
+def getTokenizer():
+    return tokenizer
+
+# word_tokenize of NLTK, imported on first use
+def nltkTokenize(text):
+    global word_tokenize
+    if word_tokenize is None:
+        from nltk.tokenize import word_tokenize
+    return word_tokenize(text)
+
+# characters & sequences word_tokenize separates from words
+fastSeparators = re.compile(r"""[\s()\[\]{}<>"`;@#$%&?!,:*]+|\.{2,}|--+""")
+# contractions split by word_tokenize: "don't" -> "do" "n't", "he's" -> "he" "'s"
+fastContraction = re.compile(r"(?i)^(.+?)(n't|'s|'m|'d|'ll|'re|'ve)$")
+# words split in two by word_tokenize
+fastSplitWords = {"cannot": 3, "gimme": 3, "gonna": 3, "gotta": 3, "lemme": 3, "wanna": 3}
+
+def fastTokenize(text):
+    words = []
+    for piece in fastSeparators.split(text):
+        # quotes around the word & the final period are separated
+        piece = piece.strip("'")
+        if piece.endswith(".") and len(piece) > 1:
+            piece = piece[:-1]
+        if not piece:
+            continue
+        split = fastSplitWords.get(piece.lower())
+        if split is not None:
+            words.append(piece[:split])
+            words.append(piece[split:])
+            continue
+        match = fastContraction.match(piece)
+        if match is not None:
+            words.append(match.group(1))
+            words.append(match.group(2))
+        else:
+            words.append(piece)
+    return words
+
+# Get title & content of a PR as one list of words
+def tokenize(title, content):
+    if tokenizer == "fast":
+        words = fastTokenize(title)
+        words.extend(fastTokenize(content))
+        return words
+    words = nltkTokenize(title)
+    words.extend(nltkTokenize(content))
+    return words
+
+# [word, stem] pairs of the words kept in a list of words
+def cleanTokens(words):
+    pairs = []
+    for word in words:
+        stword = cleanWord(word)
+        if stword is not None:
+            pairs.append([word, stword])
+    return pairs
+
+# stems of the words kept in the title & content of a PR
+def clean(title, content):
+    stems = []
+    for word in tokenize(title, content):
+        stword = cleanWord(word)
+        if stword is not None:
+            stems.append(stword)
+    return stems
+
+##############################################################################
+# Compare the fast tokenizer with word_tokenize on PRs
+#
+# Input:
+#   rows: PR rows of a dataset (see ingest.readPRs())
+#
+# Output:
+#   dict of
+#     PRs: number of PRs
+#     samePRs: PRs whose kept [word, stem] pairs are the same with both tokenizers
+#     keptNltk, keptFast: numbers of words kept with each tokenizer
+#     common: words kept by both, counted with multiplicity
+#     agreement: common / max(keptNltk, keptFast)
+#     nltkSeconds, fastSeconds: time spent tokenizing
+#     onlyNltk, onlyFast: most frequent words kept by one tokenizer only, as [word, count]
+##############################################################################
+def compareTokenizers(rows, top = 20):
+    report = {"PRs": 0, "samePRs": 0, "keptNltk": 0, "keptFast": 0, "common": 0, "nltkSeconds": 0.0, "fastSeconds": 0.0}
+    onlyNltk = Counter()
+    onlyFast = Counter()
+    for row in rows:
+        start = time.perf_counter()
+        nltkWords = nltkTokenize(row[1]) + nltkTokenize(row[2])
+        report["nltkSeconds"] += time.perf_counter() - start
+        start = time.perf_counter()
+        fastWords = fastTokenize(row[1]) + fastTokenize(row[2])
+        report["fastSeconds"] += time.perf_counter() - start
+        
+        nltkKept = cleanTokens(nltkWords)
+        fastKept = cleanTokens(fastWords)
+        report["PRs"] += 1
+        if nltkKept == fastKept:
+            report["samePRs"] += 1
+        nltkCount = Counter(word for word, stword in nltkKept)
+        fastCount = Counter(word for word, stword in fastKept)
+        report["keptNltk"] += len(nltkKept)
+        report["keptFast"] += len(fastKept)
+        report["common"] += sum((nltkCount & fastCount).values())
+        onlyNltk.update(nltkCount - fastCount)
+        onlyFast.update(fastCount - nltkCount)
+    kept = max(report["keptNltk"], report["keptFast"])
+    report["agreement"] = float(report["common"]) / kept if kept else 1.0
+    report["onlyNltk"] = [list(each) for each in onlyNltk.most_common(top)]
+    report["onlyFast"] = [list(each) for each in onlyFast.most_common(top)]
+    return report
@@ -0,0 +1,63 @@
+import heapq
+
+import optional
+
+###############################################################################
+# Bounded top-K selection
+#
+# Items are [score, ind] pairs. Only items with score > floor are kept.
+# Ties are broken by ascending ind, so results never depend on the order the
+# items are met: the top-K is always the first K items sorted by descending
+# score then ascending ind.
+###############################################################################
+
+# streaming selector based on a heap of the K best items met so far
+class TopK(object):
+
+    def __init__(self, K, floor = 0.0):
+        self.__K = K
+        self.__floor = floor
+        # min-heap of (score, -ind). The root is the worst item kept
+        self.__heap = []
+
+    def clear(self):
+        self.__heap = []
+
+    def push(self, score, ind):
+        if score <= self.__floor or self.__K <= 0:
+            return
+        item = (score, -ind)
+        if len(self.__heap) < self.__K:
+            heapq.heappush(self.__heap, item)
+        elif item > self.__heap[0]:
+            heapq.heapreplace(self.__heap, item)
+
+    # the score an item must beat to get in, once K items are kept
+    def threshold(self):
+        if len(self.__heap) < self.__K:
+            return self.__floor
+        return self.__heap[0][0]
+
+    # the selected [score, ind] pairs by descending score then ascending ind
+    def result(self):
+        return [[score, -negInd] for score, negInd in sorted(self.__heap, reverse=True)]
+
+# select the top-K of an iterable of (score, ind) pairs
+def topK(K, items, floor = 0.0):
+    selector = TopK(K, floor)
+    for score, ind in items:
+        selector.push(score, ind)
+    return selector.result()
+
+# select the top-K of a numpy array of scores, the index of a score being its position
+def topKArray(K, scores, floor = 0.0):
+    np = optional.require("numpy", "topKArray")
+    if K <= 0:
+        return []
+    idx = np.flatnonzero(scores > floor)
+    if len(idx) > K:
+        # keep every item not worse than the K-th best score, ties are resolved below
+        kth = np.partition(scores[idx], len(idx)-K)[len(idx)-K]
+        idx = idx[scores[idx] >= kth]
+    order = np.lexsort((idx, -scores[idx]))[:K]
+    return [[float(scores[i]), int(i)] for i in idx[order]]
@@ -1,49 +1,55 @@
 import math
+from collections import Counter
 
 ###############################################################################
 # Calculate vector scores of all PRs in the given vector space by tfidf 
 #
 # Input:
-# PRs: all PRs that need to get vector scores
-# vectorBase: base of vector space in the training dataset
-# vectorBaseCnt: numbers of appearance of each word in vector space
-# fileSize: size of training dataset
+# PRs: all PRs that need to get vector scores. PR[1] is the list of words of the PR
+# vectorBase: base of vector space in the training dataset, a Vocabulary (see vocabulary.py)
+#             holding the id and the number of appearance of each word
+# fileSize: size of training dataset. PRs all get empty vector scores when it is 0
 #
 # Output:
 # scores: vector scores for all PRs in the input. Same length as PRs in input
+#         each score is a sparse vector: a dict mapping the index of a word in
+#         vector space to its tfidf value, with keys in ascending index order
 #
 ###############################################################################
-def tfidf(PRs, vectorBase, vectorBaseCnt, fileSize):
-    vlen = len(vectorBase)
+def tfidf(PRs, vectorBase, fileSize):
+    return tfidfTerms([[vectorBase.find(word) for word in PR[1]] for PR in PRs], vectorBase, fileSize)
+
+###############################################################################
+# Same as tfidf(), with the contents of PRs given as indices in vector space
+#
+# Input:
+# contents: for each PR, the indices in vector space of its words. Words that
+#           don't exist in vector space have index -1 (they still count in the length)
+###############################################################################
+def tfidfTerms(contents, vectorBase, fileSize):
     scores = []
     
-    for PR in PRs:
+    for content in contents:
         # for each PR, the vector score is a vector in the same dimensional as vector space. 
         # For each dimension, the value equals to the tfidf value of the word in the PR content, given the whole word dataset
-        score = [0.0]*vlen
+        # Only dimensions of words appearing in the PR are stored, the others are 0.0
+        score = {}
         
         # actual contents of the PR
-        content = PR[1]
         tlen = len(content)
         
-        # for each word
-        for i in range(tlen):
-            word = content[i]
-            
-            # if this word appears the first time in the PR content
-            if (content.index(word) == i):
-                try:
-                    # Get the correspond index of the word in vector space
-                    ind = vectorBase.index(word)
-                    # score equals to tfidf value
-                    score[ind] = math.log(1+float(content.count(word))/tlen)*math.log(float(fileSize)/vectorBaseCnt[ind])
-                    
-                # Error happens when the word in content doesn't exist in vector space, which may happen in testing phase
-                except ValueError:
-                    continue
+        # count every word of the content in a single pass
+        for ind, cnt in Counter(content).items():
+            # the word in content doesn't exist in vector space, which may happen in testing phase
+            if ind < 0:
+                continue
+            # no PR kept in the training dataset yet, though words of dropped PRs may be counted
+            if fileSize == 0:
+                break
+            # score equals to tfidf value
+            score[ind] = math.log(1+float(cnt)/tlen)*math.log(float(fileSize)/vectorBase.getCount(ind))
         
-        # append the score into result list
-        scores.append(score)
+        # append the score into result list, ordered by index in vector space
+        scores.append(dict(sorted(score.items())))
         
     return scores
-            
\ No newline at end of file
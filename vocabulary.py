@@ -0,0 +1,77 @@
+from array import array
+
+###############################################################################
+# Vocabulary of a project, i.e. the base of vector space.
+#
+# Every stemmed word gets a dense integer id in order of first appearance.
+# Lookups go through a dict from word to id, and the appearance counts of the
+# words (used as document frequency by tfidf) are kept in an array indexed by id.
+###############################################################################
+class Vocabulary(object):
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        # word -> id
+        self.__ids = {}
+        # id -> word
+        self.__words = []
+        # id -> number of times the word has appeared in the project
+        self.__counts = array('l')
+
+    # replace the vocabulary by the given words & appearance counts, in id order
+    def load(self, words, counts):
+        self.__words = list(words)
+        self.__ids = dict(zip(self.__words, range(len(self.__words))))
+        self.__counts = counts
+
+    # replace the words by the equal ones of table, a dict from each word to itself shared by several
+    # vocabularies, so that a word appearing in several projects is stored once. New words are added into table
+    def intern(self, table):
+        self.__words = [table.setdefault(word, word) for word in self.__words]
+        self.__ids = dict(zip(self.__words, range(len(self.__words))))
+        return table
+
+    # return the number of words in the vocabulary
+    def length(self):
+        return len(self.__words)
+
+    def __len__(self):
+        return len(self.__words)
+
+    def __contains__(self, word):
+        return word in self.__ids
+
+    # return the id of a word, or -1 if it is not in the vocabulary
+    def find(self, word):
+        return self.__ids.get(word, -1)
+
+    # add a word into the vocabulary and return its id.
+    # a new word starts with an appearance count of 1, an existing one is left untouched
+    def add(self, word):
+        ind = self.__ids.get(word, -1)
+        if ind < 0:
+            ind = len(self.__words)
+            self.__ids[word] = ind
+            self.__words.append(word)
+            self.__counts.append(1)
+        return ind
+
+    # add the appearance count of the word with the given id
+    def addCount(self, ind, cnt = 1):
+        self.__counts[ind] += cnt
+
+    def getWord(self, ind):
+        return self.__words[ind]
+
+    def getCount(self, ind):
+        return self.__counts[ind]
+
+    # all words in id order
+    def getWords(self):
+        return self.__words
+
+    # appearance counts of all words in id order
+    def getCounts(self):
+        return self.__counts